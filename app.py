@@ -1,9 +1,16 @@
 import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import asyncio
-from debate_research_workflow import research_debate_topic
-from podcast_script_generator import generate_podcast_script
+import time
+from debate_research_workflow import research_debate_topic, stance_types_for, stance_label, MAX_PERSPECTIVES
+from podcast_script_generator import generate_podcast_script, DEBATER_ROSTER, MODERATOR_VOICE
 from podcast_audio_recorder import PodcastAudioRecorder
+from tts_backends import warm_up_speech_in_background
 from debate_illustrator import generate_debate_illustration
+from artifact_store import get_artifact_store
+from topic_index import get_topic_index
+from cancellation import CancellationToken, RunCancelled
 
 # Configure page
 st.set_page_config(
@@ -26,11 +33,11 @@ with st.sidebar:
         st.markdown("""
         1. Enter any topic you need to research for decision-making
         2. The system will:
-           - Analyze the topic and identify clear opposing stances
+           - Analyze the topic and identify clear opposing stances (or several perspectives)
            - Generate a custom illustration of the debate scene
            - Perform targeted research for each stance
            - Generate well-structured essays supporting each position
-           - Create a podcast script with a moderator and two debaters
+           - Create a podcast script with a moderator and one debater per perspective
            - Generate audio using different voices for each speaker
         3. View the results in the tabs above:
            - For Stance: Essay supporting the position
@@ -50,6 +57,23 @@ st.markdown('''**For My Wife** is a multi-agentic research system designed to he
 
 # Input section
 topic = st.text_input("🔍 Enter a Research Topic for Debate:", "Should I buy the new Nintendo Switch 2?")
+num_perspectives = st.slider(
+    "🗣️ Number of perspectives",
+    min_value=2,
+    max_value=MAX_PERSPECTIVES,
+    value=2,
+    help="Use more than two when the topic has several real options, e.g. comparing products"
+)
+fetch_pages = st.checkbox(
+    "📖 Read full source pages",
+    value=False,
+    help="Researchers read the cited web pages, not just search snippets. Deeper essays, slightly slower."
+)
+reuse_debates = st.checkbox(
+    "♻️ Reuse an earlier debate on the same topic",
+    value=True,
+    help="If this topic (or a near-identical wording) was debated before, show that debate instantly instead of starting over"
+)
 generate_button = st.button("Fight!!! 🥊", use_container_width=True)
 
 # Create status containers
@@ -95,11 +119,125 @@ def download_section(script_data, audio_path, illustration_path, topic):
                 mime="image/png"
             )
 
+def render_essay(container, stance, essay, references):
+    with container.container():
+        st.markdown(f"> **{stance}**")
+        st.markdown(essay)
+        st.markdown("## 📚 References")
+        for i, url in enumerate(references, 1):
+            st.markdown(f"{i}. {url}")
+
+_rerun_detection_warned = False
+
+def run_abandoned_probe():
+    """
+    Build a probe telling whether this script run has been abandoned: the browser session
+    went away (page reloaded or closed), or Streamlit is waiting to rerun or stop the script
+    (topic edited, button pressed again). Streamlit only acts on those at its next UI call,
+    which during script or audio generation can be minutes away.
+    """
+    global _rerun_detection_warned
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return lambda: False
+    session_id = ctx.session_id
+    # Private Streamlit state (checked against the version range in requirements.txt)
+    script_requests = getattr(ctx, "script_requests", None)
+    if not hasattr(script_requests, "_state") and not _rerun_detection_warned:
+        _rerun_detection_warned = True
+        print("Warning: this Streamlit version doesn't expose pending reruns; runs are only "
+              "cancelled when their browser session closes, not when the topic is edited")
+
+    def abandoned():
+        if Runtime.exists() and not Runtime.instance().is_active_session(session_id):
+            return True
+        state = getattr(script_requests, "_state", None)
+        return state is not None and getattr(state, "value", "CONTINUE") != "CONTINUE"
+    return abandoned
+
+def render_podcast(container, script_data, audio_path, illustration_path, topic):
+    with container.container():
+        st.markdown("## 🎧 Podcast Audio")
+        with open(audio_path, "rb") as f:
+            audio_bytes = f.read()
+        st.audio(audio_bytes, format="audio/wav")
+        
+        st.markdown("## 📜 Podcast Script")
+        for entry in script_data["dialogue"]:
+            st.markdown(f"**[{entry['role']}]**: {entry['text']}")
+        
+        # Use the fragment for downloads
+        st.markdown("## 📥 Downloads")
+        download_section(script_data, audio_path, illustration_path, topic)
+
 if generate_button:
+    cancel_token = CancellationToken(probe=run_abandoned_probe())
+    run_id = None
     try:
+        # A near-identical topic may already have a finished debate
+        previous = get_topic_index().find(topic, num_perspectives) if reuse_debates else None
+        debate = get_topic_index().load_debate(previous["run_id"]) if previous else None
+
+        # Lay out the tabs up front so essays can stream into them while they are written
+        stance_types = stance_types_for(num_perspectives)
+        tab_icons = {"for": "👍", "against": "👎"}
+        with tabs_placeholder.container():
+            tabs = st.tabs(
+                [f"{tab_icons.get(stance, '🗣️')} {stance_label(stance)} Stance" for stance in stance_types]
+                + ["🎧 Podcast"]
+            )
+            essay_placeholders = {}
+            for stance, tab in zip(stance_types, tabs):
+                with tab:
+                    essay_placeholders[stance] = st.empty()
+            with tabs[-1]:
+                podcast_placeholder = st.empty()
+                podcast_placeholder.info("The podcast will appear here once the essays are done.")
+
+        if debate:
+            update_status(f"♻️ Found an earlier debate on \"{previous['topic']}\"; showing it instead of starting over")
+            result = debate["research"]
+            for stance, placeholder in essay_placeholders.items():
+                render_essay(placeholder, result[stance]["stance"], result[stance]["essay"], result[stance]["references"])
+            if debate["illustration_path"]:
+                illustration_placeholder.image(debate["illustration_path"], caption="Debate Scene Illustration", use_container_width=True)
+            render_podcast(podcast_placeholder, debate["script"], debate["audio_path"], debate["illustration_path"], topic)
+            update_status("✨ All processing complete! (Untick the reuse option to run a fresh debate)")
+            st.stop()
+
+        streamed_essays = {stance: "" for stance in essay_placeholders}
+        last_render = {stance: 0.0 for stance in essay_placeholders}
+
+        def on_essay_token(stance_type, delta):
+            streamed_essays[stance_type] += delta
+            # Throttle re-renders; every token would flood the websocket
+            now = time.monotonic()
+            if now - last_render[stance_type] > 0.15:
+                last_render[stance_type] = now
+                essay_placeholders[stance_type].markdown(streamed_essays[stance_type] + " ▌")
+
+        # Open speech connections for this debate's voices while research runs
+        try:
+            warm_up_speech_in_background(
+                [MODERATOR_VOICE] + [debater["voice"] for debater in DEBATER_ROSTER[:num_perspectives]]
+            )
+        except ValueError:
+            pass  # Missing speech credentials are reported when audio generation starts
+        
         # First generate the research to get stance summaries
         update_status(f"🔍 Starting research on topic: {topic}")
-        result = asyncio.run(research_debate_topic(topic))
+        # Every run writes into its own artifact namespace
+        run_id = get_artifact_store().create_run(topic)
+        result = asyncio.run(research_debate_topic(
+            topic,
+            run_id=run_id,
+            on_essay_token=on_essay_token,
+            num_perspectives=num_perspectives,
+            fetch_pages=fetch_pages,
+            cancel_token=cancel_token
+        ))
+        for stance, placeholder in essay_placeholders.items():
+            render_essay(placeholder, result[stance]["stance"], result[stance]["essay"], result[stance]["references"])
         update_status("✅ Research complete and essays generated")
         
         # Generate and display illustration immediately
@@ -107,7 +245,10 @@ if generate_button:
         illustration_path = asyncio.run(generate_debate_illustration(
             topic=topic,
             for_stance="",  # Not needed
-            against_stance=""  # Not needed
+            against_stance="",  # Not needed
+            run_id=run_id,
+            debater_roles=[debater["role"] for debater in DEBATER_ROSTER[:num_perspectives]],
+            cancel_token=cancel_token
         ))
         if illustration_path:
             illustration_placeholder.image(illustration_path, caption="Debate Scene Illustration", use_container_width=True)
@@ -117,48 +258,38 @@ if generate_button:
         update_status("📝 Generating podcast script...")
         script_data = asyncio.run(generate_podcast_script(
             topic=topic,
-            for_essay=result["for"]["essay"],
-            against_essay=result["against"]["essay"]
+            run_id=run_id,
+            parallel=True,
+            perspectives=[
+                {"stance_type": stance, "stance": stance_result["stance"], "essay": stance_result["essay"]}
+                for stance, stance_result in result.items()
+            ],
+            cancel_token=cancel_token
         ))
         update_status("✅ Debate script generated")
         
         update_status("🎙 Generating audio recording...")
         recorder = PodcastAudioRecorder()
-        audio_path = asyncio.run(recorder.generate_podcast_audio(script_data))
+        audio_path = asyncio.run(recorder.generate_podcast_audio(script_data, run_id=run_id, cancel_token=cancel_token))
         update_status("✅ Audio recording complete")
         
-        # Display results in tabs
-        with tabs_placeholder.container():
-            tab1, tab2, tab3 = st.tabs(["👍 For Stance", "👎 Against Stance", "🎧 Podcast"])
-            
-            with tab1:
-                st.markdown(result["for"]["essay"])
-                st.markdown("## 📚 References")
-                for i, url in enumerate(result["for"]["references"], 1):
-                    st.markdown(f"{i}. {url}")
-                    
-            with tab2:
-                st.markdown(result["against"]["essay"])
-                st.markdown("## 📚 References")
-                for i, url in enumerate(result["against"]["references"], 1):
-                    st.markdown(f"{i}. {url}")
-            
-            with tab3:
-                st.markdown("## 🎧 Podcast Audio")
-                with open(audio_path, "rb") as f:
-                    audio_bytes = f.read()
-                st.audio(audio_bytes, format="audio/wav")
-                
-                st.markdown("## 📜 Podcast Script")
-                for entry in script_data["dialogue"]:
-                    st.markdown(f"**[{entry['role']}]**: {entry['text']}")
-                
-                # Use the fragment for downloads
-                st.markdown("## 📥 Downloads")
-                download_section(script_data, audio_path, illustration_path, topic)
+        # Fill in the podcast tab
+        render_podcast(podcast_placeholder, script_data, audio_path, illustration_path, topic)
+        get_topic_index().record(topic, run_id, num_perspectives)
         
         update_status("✨ All processing complete!")
         
+    except RunCancelled:
+        # Nobody will see this run's results; don't keep its partial artifacts either
+        if run_id:
+            get_artifact_store().delete_run(run_id)
+        update_status("🛑 Run abandoned; stopped early and cleaned up")
     except Exception as e:
         update_status(f"⚠️ Error: {str(e)}")
-        st.error(f"An error occurred: {str(e)}") 
\ No newline at end of file
+        st.error(f"An error occurred: {str(e)}")
+    except BaseException:
+        # Streamlit interrupting the script for a rerun or stop also abandons the run
+        cancel_token.cancel("Script run interrupted")
+        if run_id:
+            get_artifact_store().delete_run(run_id)
+        raise 
\ No newline at end of file
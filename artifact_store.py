@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_ROOT = os.getenv("ARTIFACT_ROOT", "output")
+DEFAULT_MAX_AGE_SECONDS = float(os.getenv("ARTIFACT_MAX_AGE_HOURS", "72")) * 3600
+DEFAULT_MAX_TOTAL_BYTES = int(float(os.getenv("ARTIFACT_MAX_TOTAL_MB", "2048")) * 1024 * 1024)
+DEFAULT_GC_INTERVAL_SECONDS = 600
+
+def slugify_topic(topic: str, max_length: int = 60) -> str:
+    """Turn a topic into a filesystem-safe slug (same spirit as the old output names)."""
+    slug = ''.join(char if char.isalnum() else '_' for char in topic.lower())
+    slug = '_'.join(part for part in slug.split('_') if part)
+    return slug[:max_length] or 'untitled'
+
+class ArtifactStore:
+    """
+    Stores the files produced by a debate run (essays, script, audio, illustration).
+
+    Every run gets its own namespace under `<root>/runs/<run_id>/`, so concurrent users
+    researching the same topic never overwrite each other. File contents are stored once
+    under `<root>/blobs/` by SHA-256 and hard-linked into the run directories, writes are
+    atomic (temp file + rename), and old runs are garbage collected by age and total size.
+    """
+
+    def __init__(
+        self,
+        root: str = DEFAULT_ROOT,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        max_total_bytes: int = DEFAULT_MAX_TOTAL_BYTES,
+        gc_interval_seconds: float = DEFAULT_GC_INTERVAL_SECONDS,
+        active_grace_seconds: float = 900
+    ):
+        self.root = root
+        self.runs_dir = os.path.join(root, 'runs')
+        self.blobs_dir = os.path.join(root, 'blobs')
+        self.max_age_seconds = max_age_seconds
+        self.max_total_bytes = max_total_bytes
+        self.gc_interval_seconds = gc_interval_seconds
+        # Runs touched more recently than this are never evicted for size reasons,
+        # so a run that is still being written is not pulled out from under its session.
+        self.active_grace_seconds = active_grace_seconds
+
+        self._gc_lock = threading.Lock()
+        self._gc_stop = threading.Event()
+        self._gc_thread = None
+
+        os.makedirs(self.runs_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------ runs
+
+    def create_run(self, topic: str) -> str:
+        """Create a new run namespace for a topic and return its id."""
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{slugify_topic(topic)}_{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.run_dir(run_id), exist_ok=False)
+        return run_id
+
+    def run_dir(self, run_id: str) -> str:
+        if not run_id or os.sep in run_id or run_id in ('.', '..'):
+            raise ValueError(f"Invalid run id: {run_id!r}")
+        return os.path.join(self.runs_dir, run_id)
+
+    def path(self, run_id: str, name: str) -> str:
+        """Path of a named artifact inside a run."""
+        if not name or os.path.basename(name) != name:
+            raise ValueError(f"Invalid artifact name: {name!r}")
+        return os.path.join(self.run_dir(run_id), name)
+
+    def list_runs(self) -> List[str]:
+        try:
+            return sorted(os.listdir(self.runs_dir))
+        except FileNotFoundError:
+            return []
+
+    def run_exists(self, run_id: str) -> bool:
+        return os.path.isdir(self.run_dir(run_id))
+
+    def delete_run(self, run_id: str):
+        """Remove a run namespace; blobs it referenced are reclaimed by the next GC."""
+        shutil.rmtree(self.run_dir(run_id), ignore_errors=True)
+
+    # ---------------------------------------------------------------- writes
+
+    def write_bytes(self, run_id: str, name: str, data: bytes) -> str:
+        """Atomically store `data` as artifact `name` of `run_id` and return its path."""
+        target = self.path(run_id, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest, os.path.splitext(name)[1])
+        if not os.path.exists(blob_path):
+            self._atomic_write(blob_path, data)
+
+        try:
+            # Hard-link the shared blob into the run, then rename over the target so
+            # readers only ever see a complete file.
+            tmp_link = f"{target}.{uuid.uuid4().hex}.tmp"
+            os.link(blob_path, tmp_link)
+            os.replace(tmp_link, target)
+        except OSError:
+            # Filesystems without hard links (or a blob collected in between) get a copy
+            self._atomic_write(target, data)
+        return target
+
+    def write_text(self, run_id: str, name: str, text: str) -> str:
+        return self.write_bytes(run_id, name, text.encode('utf-8'))
+
+    def write_json(self, run_id: str, name: str, obj) -> str:
+        return self.write_text(run_id, name, json.dumps(obj, indent=2, ensure_ascii=False))
+
+    def _blob_path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], f"{digest}{extension}")
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # -------------------------------------------------------------------- gc
+
+    def total_bytes(self) -> int:
+        """Disk usage of the store, counting each hard-linked file once."""
+        seen = set()
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for file in files:
+                try:
+                    stat = os.stat(os.path.join(directory, file))
+                except FileNotFoundError:
+                    continue
+                key = (stat.st_dev, stat.st_ino)
+                if key not in seen:
+                    seen.add(key)
+                    total += stat.st_size
+        return total
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """Delete expired runs, then the oldest runs until under the size budget."""
+        with self._gc_lock:
+            now = time.time()
+            removed_runs = 0
+
+            runs = []
+            for run_id in self.list_runs():
+                try:
+                    mtime = self._run_mtime(run_id)
+                except FileNotFoundError:
+                    continue
+                if now - mtime > self.max_age_seconds:
+                    self.delete_run(run_id)
+                    removed_runs += 1
+                else:
+                    runs.append((mtime, run_id))
+
+            removed_blobs = self._remove_orphan_blobs(now)
+
+            # Evict oldest first until we are under budget
+            runs.sort()
+            total = self.total_bytes()
+            for mtime, run_id in runs:
+                if total <= self.max_total_bytes:
+                    break
+                if now - mtime < self.active_grace_seconds:
+                    continue
+                self.delete_run(run_id)
+                removed_runs += 1
+                removed_blobs += self._remove_orphan_blobs(now)
+                total = self.total_bytes()
+
+            return {
+                "removed_runs": removed_runs,
+                "removed_blobs": removed_blobs,
+                "total_bytes": total
+            }
+
+    def _run_mtime(self, run_id: str) -> float:
+        run_dir = self.run_dir(run_id)
+        mtime = os.stat(run_dir).st_mtime
+        for file in os.listdir(run_dir):
+            try:
+                mtime = max(mtime, os.lstat(os.path.join(run_dir, file)).st_mtime)
+            except FileNotFoundError:
+                pass
+        return mtime
+
+    def _remove_orphan_blobs(self, now: float) -> int:
+        """Remove blobs no run links to any more (link count of 1)."""
+        removed = 0
+        for directory, _, files in os.walk(self.blobs_dir):
+            for file in files:
+                path = os.path.join(directory, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Leave fresh blobs alone: a writer may be about to link them into a run
+                if stat.st_nlink <= 1 and now - stat.st_mtime > 60:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def start_background_gc(self):
+        """Run `collect_garbage` periodically on a daemon thread."""
+        if self._gc_thread and self._gc_thread.is_alive():
+            return
+        self._gc_stop.clear()
+        self._gc_thread = threading.Thread(target=self._gc_loop, name='artifact-gc', daemon=True)
+        self._gc_thread.start()
+
+    def stop_background_gc(self):
+        self._gc_stop.set()
+        if self._gc_thread:
+            self._gc_thread.join(timeout=5)
+
+    def _gc_loop(self):
+        while not self._gc_stop.is_set():
+            try:
+                stats = self.collect_garbage()
+                if stats["removed_runs"] or stats["removed_blobs"]:
+                    print(f"Artifact GC: {stats}")
+            except Exception as e:
+                print(f"Artifact GC failed: {str(e)}")
+            self._gc_stop.wait(self.gc_interval_seconds)
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_artifact_store() -> ArtifactStore:
+    """Process-wide store shared by all sessions, with background GC running."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+            _default_store.start_background_gc()
+        return _default_store
+
+def set_artifact_store(store: ArtifactStore):
+    """Replace the process-wide store, e.g. to point a test harness at a scratch directory."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is not None and _default_store is not store:
+            _default_store.stop_background_gc()
+        _default_store = store
+
+def resolve_run(topic: str, run_id: Optional[str] = None, store: Optional[ArtifactStore] = None):
+    """Return `(store, run_id)`, creating a run for standalone callers that did not pass one."""
+    store = store or get_artifact_store()
+    if run_id is None:
+        run_id = store.create_run(topic)
+    return store, run_id
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class RunCancelled(Exception):
+    """Raised when a run is abandoned (new run, edited topic, closed page) before it finishes."""
+
+class CancellationToken:
+    """
+    Run-scoped cancellation flag shared by every stage of a debate run.
+
+    A run is cancelled explicitly with `cancel()`, or when the optional `probe` starts
+    returning True (e.g. "the browser session that started this run has gone away").
+    Stages call `check_cancelled(token)` before each provider call, and `run_cancellable`
+    interrupts whatever the run is awaiting as soon as cancellation is noticed. Work
+    already handed to a thread finishes, but nothing new is started.
+    """
+
+    def __init__(self, probe: Optional[Callable[[], bool]] = None, poll_interval: float = 0.25):
+        self.probe = probe
+        self.poll_interval = poll_interval
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "Run cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.probe is not None:
+            try:
+                abandoned = self.probe()
+            except Exception:
+                abandoned = False
+            if abandoned:
+                # Latch it: a probe may stop reporting once its condition has been handled
+                self.cancel("Run abandoned")
+                return True
+        return False
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RunCancelled(self.reason)
+
+def check_cancelled(token: Optional[CancellationToken]):
+    """Raise RunCancelled if `token` has been cancelled; no-op without a token."""
+    if token is not None:
+        token.raise_if_cancelled()
+
+async def run_cancellable(awaitable: Awaitable[T], token: Optional[CancellationToken]) -> T:
+    """
+    Await `awaitable`, cancelling it and raising RunCancelled as soon as `token` is
+    cancelled. In-flight async provider calls are aborted by the task cancellation.
+    """
+    if token is None:
+        return await awaitable
+    if token.cancelled:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise RunCancelled(token.reason)
+
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=token.poll_interval)
+            if done:
+                # Failures after cancellation (e.g. a step's RunCancelled wrapped by the
+                # workflow runtime) are just the cancellation surfacing
+                if task.exception() is not None and token.cancelled:
+                    raise RunCancelled(token.reason) from task.exception()
+                return task.result()
+            if token.cancelled:
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+    raise RunCancelled(token.reason)
@@ -1,9 +1,12 @@
 import os
+import asyncio
 from llama_index.llms.azure_openai import AzureOpenAI 
-from openai import OpenAI as oai
-import requests
+from openai import AsyncOpenAI as oai
+import httpx
 from dotenv import load_dotenv
-from pathlib import Path
+from typing import List, Optional
+from artifact_store import resolve_run
+from cancellation import CancellationToken, run_cancellable
 
 load_dotenv()
 
@@ -12,23 +15,36 @@ os.environ["OPENAI_API_KEY"] = os.getenv("AZURE_OPENAI_KEY")
 os.environ["AZURE_OPENAI_ENDPOINT"] = os.getenv("AZURE_OPENAI_ENDPOINT")
 os.environ["OPENAI_API_VERSION"] = os.getenv("AZURE_OPENAI_API_VERSION")
 
-def download_image(url: str, save_path: str) -> bool:
-    """Download an image from a URL and save it to disk"""
-    response = requests.get(url)
+async def download_image(url: str, timeout: float = 60.0) -> Optional[bytes]:
+    """Download an image from a URL and return its bytes"""
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        response = await client.get(url)
     if response.status_code == 200:
-        # Ensure directory exists
-        Path(save_path).parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(save_path, 'wb') as file:
-            file.write(response.content)
-        print('Debate illustration successfully downloaded and saved')
-        return True
+        print('Debate illustration successfully downloaded')
+        return response.content
     else:
         print('Failed to download debate illustration')
-        return False
+        return None
 
-async def generate_debate_illustration(topic: str, for_stance: str, against_stance: str) -> str:
-    """Generate an illustration for a debate scene with specific characters"""
+async def generate_debate_illustration(
+    topic: str,
+    for_stance: str,
+    against_stance: str,
+    run_id: Optional[str] = None,
+    debater_roles: Optional[List[str]] = None,
+    cancel_token: Optional[CancellationToken] = None
+) -> str:
+    """
+    Generate an illustration for a debate scene with specific characters.
+    Pass `debater_roles` (e.g. ["MR. YES", "MS. NO", "MR. MAYBE"]) to draw a larger panel.
+    Raises RunCancelled without calling DALL-E once `cancel_token` is cancelled.
+    """
+    if debater_roles and len(debater_roles) > 2:
+        debater_elements = f"""2. A panel of {len(debater_roles)} debaters, each at their own podium with a name plate: {', '.join(debater_roles)}
+3. Each debater visibly distinct, representing a different perspective"""
+    else:
+        debater_elements = """2. A male debater named MR. YES on one side (for stance)
+3. A female debater named MS. NO on the other side (against stance)"""
     # First, generate the prompt using GPT-4
     llm = AzureOpenAI(
         engine="gpt-4o-mini",
@@ -44,8 +60,7 @@ Topic being debated: {topic}
 
 Required elements:
 1. A professional male moderator in the center
-2. A male debater named MR. YES on one side (for stance)
-3. A female debater named MS. NO on the other side (against stance)
+{debater_elements}
 4. Modern debate stage or studio setting
 5. Visual elements that represent the debate topic
 
@@ -55,30 +70,30 @@ Style requirements:
 
 Write only the DALL-E prompt, no other text.'''
     
-    prompt_response = llm.complete(prompt_text)
+    # Async clients throughout, so cancelling an abandoned run aborts the request in flight
+    prompt_response = await run_cancellable(llm.acomplete(prompt_text), cancel_token)
     draw_prompt = str(prompt_response)
     print(f"Generated prompt: {draw_prompt}")
     
     # Generate the image using DALL-E
     client = oai(api_key=os.getenv("OPENAI_API_KEY_REGULAR"))
-    response = client.images.generate(
+    response = await run_cancellable(client.images.generate(
         model="dall-e-3",
         prompt=draw_prompt,
         size="1024x1024",
         quality="hd",
         n=1
-    )
+    ), cancel_token)
 
     image_url = response.data[0].url
     print(f"Generated image URL: {image_url}")
     
-    # Create output directory and path
-    output_path = f"output/debate_illustration_{topic.replace(' ', '_').lower()}.png"
-    
-    # Download and save the image
-    if download_image(image_url, output_path):
-        return output_path
-    return None
+    # Download and save the image into the run's artifact namespace
+    image_bytes = await run_cancellable(download_image(image_url), cancel_token)
+    if image_bytes is None:
+        return None
+    store, run_id = resolve_run(topic, run_id)
+    return store.write_bytes(run_id, "debate_illustration.png", image_bytes)
 
 async def main():
     # Test the illustration generation
@@ -94,5 +109,4 @@ async def main():
         print("Failed to generate illustration")
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main()) 
\ No newline at end of file
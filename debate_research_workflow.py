@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient
 from llama_index.core.workflow import (
     Event,
     StartEvent,
@@ -13,9 +13,15 @@ from llama_index.llms.azure_openai import AzureOpenAI
 from llama_index.core.llms import ChatMessage
 from pydantic import BaseModel
 import json
+import re
+import uuid
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional, Callable, Tuple
 from podcast_script_generator import generate_podcast_script
+from artifact_store import resolve_run
+from page_fetcher import PageFetcher
+from research_corpus import get_research_corpus
+from cancellation import CancellationToken, check_cancelled, run_cancellable
 
 load_dotenv()
 
@@ -24,30 +30,73 @@ os.environ["OPENAI_API_KEY"] = os.getenv("AZURE_OPENAI_KEY")
 os.environ["AZURE_OPENAI_ENDPOINT"] = os.getenv("AZURE_OPENAI_ENDPOINT")
 os.environ["OPENAI_API_VERSION"] = os.getenv("AZURE_OPENAI_API_VERSION")
 
+# Upper bound on perspectives per debate; also the number of concurrent research/essay workers
+MAX_PERSPECTIVES = 6
+
+# How much of each fetched source page goes into the essay prompt
+MAX_PAGE_CHARS = 4000
+
+def stance_types_for(num_perspectives: int) -> List[str]:
+    """Stance identifiers for a debate: the classic for/against pair, or numbered perspectives."""
+    if num_perspectives < 2 or num_perspectives > MAX_PERSPECTIVES:
+        raise ValueError(f"Number of perspectives must be between 2 and {MAX_PERSPECTIVES}")
+    if num_perspectives == 2:
+        return ["for", "against"]
+    return [f"perspective_{i}" for i in range(1, num_perspectives + 1)]
+
+# Angles for stances the model didn't provide, so research still searches something about the topic
+FALLBACK_STANCE_ANGLES = [
+    "The practical, cost-focused case on: {topic}",
+    "The long-term view on: {topic}",
+    "A cautious middle-ground position on: {topic}",
+    "The skeptic's view on: {topic}",
+    "The enthusiast's view on: {topic}",
+    "The alternatives-first view on: {topic}"
+]
+
+def stance_label(stance_type: str) -> str:
+    """Human readable label for a stance identifier, e.g. 'For' or 'Perspective 2'."""
+    return stance_type.replace('_', ' ').title()
+
+def _distinct_stances(stances) -> List[str]:
+    """Non-empty stances from a model response, without case-insensitive repeats, in order."""
+    if not isinstance(stances, list):
+        return []
+    seen = set()
+    distinct = []
+    for stance in stances:
+        stance = ' '.join(str(stance).split())
+        if stance and stance.lower() not in seen:
+            seen.add(stance.lower())
+            distinct.append(stance)
+    return distinct
+
 class StancePackage(Event):
     stance: str
-    stance_type: str  # "for" or "against"
+    stance_type: str  # "for"/"against", or "perspective_<n>" for debates with more sides
 
 class StanceSourceMaterialPackage(Event):
     stance_source_materials: str
     urls: List[str]
     stance_type: str
-
-class SourceMaterialPackage(Event):
-    source_materials_for: str
-    source_materials_against: str
-    urls_for: List[str]
-    urls_against: List[str]
+    stance: str
 
 class StanceEssayPackage(Event):
     essay: str
     stance_type: str
+    stance: str
     reference_urls: List[str]
 
+class EssayChunk(Event):
+    """Streamed piece of an essay as it is being generated"""
+    stance_type: str
+    delta: str
+
 class EssayTask(Event):
     source_materials: str
     urls: List[str]
     stance_type: str
+    stance: str
     topic: str
 
 class Stances(BaseModel):
@@ -55,20 +104,93 @@ class Stances(BaseModel):
     stance_for: str
     stance_against: str
 
+def parse_json_response(text: str):
+    """Parse JSON from an LLM response, tolerating text around the JSON object."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try to extract the JSON part from the response
+        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+        if json_match:
+            try:
+                return json.loads(json_match.group(0))
+            except json.JSONDecodeError:
+                pass
+    return None
+
 class DebateResearchWorkflow(Workflow):
+    def __init__(
+        self,
+        *args,
+        fetch_pages: bool = False,
+        use_corpus: bool = True,
+        cancel_token: Optional[CancellationToken] = None,
+        **kwargs
+    ):
+        """
+        Args:
+            fetch_pages: Also read the pages behind each stance's search results and add
+                their main text to the essay material (deeper, but slower)
+            use_corpus: Answer from the persistent research corpus when it already covers a
+                query well, and add fresh search results to it
+            cancel_token: Stop making provider calls once the run is abandoned
+        """
+        super().__init__(*args, **kwargs)
+        # One fetcher per run so per-host limits cover all stances together
+        self.page_fetcher = PageFetcher() if fetch_pages else None
+        self.corpus = get_research_corpus() if use_corpus else None
+        # Tags this run's corpus additions, so the run never counts them as prior coverage
+        self.corpus_run = uuid.uuid4().hex
+        self.cancel_token = cancel_token
+
+    async def _search(self, query: str) -> Tuple[str, List[str], bool]:
+        """
+        Source materials and URLs for a query, and whether they come from a fresh web search.
+        Uses the research corpus instead of searching when it covers the query well enough.
+        """
+        hits = []
+        if self.corpus is not None:
+            # Only material from earlier runs; this run's own search results always look
+            # like they cover it
+            hits = await asyncio.to_thread(self.corpus.search, query, exclude_run=self.corpus_run)
+            if self.corpus.is_covered(hits):
+                print(f'Research corpus covers "{query}"; skipping web search')
+                urls = list(dict.fromkeys(hit['url'] for hit in hits if hit['url']))
+                return '\n'.join(hit['text'] for hit in hits), urls, False
+
+        check_cancelled(self.cancel_token)
+        tavily_client = AsyncTavilyClient()
+        # Async, so other steps keep running and a cancelled run aborts the request
+        response = await tavily_client.search(query)
+        source_materials = '\n'.join(result['content'] for result in response['results'])
+        urls = [result['url'] for result in response['results']]
+
+        if self.corpus is not None:
+            await asyncio.to_thread(self.corpus.add_documents, [
+                {"url": result['url'], "text": result['content'], "query": query}
+                for result in response['results']
+            ], self.corpus_run)
+            # Supplement with relevant material gathered by earlier runs
+            extra = [hit for hit in hits if hit['score'] >= self.corpus.min_score and hit['url'] not in urls]
+            if extra:
+                source_materials += '\n' + '\n'.join(hit['text'] for hit in extra)
+                urls += list(dict.fromkeys(hit['url'] for hit in extra if hit['url']))
+
+        return source_materials, urls, True
+
     @step
     async def identify_stances(self, ctx: Context, ev: StartEvent) -> StancePackage:
         topic = ev.query
-        print(f'topic: {topic}')
+        num_perspectives = ev.get("num_perspectives", 2)
+        stance_types = stance_types_for(num_perspectives)
+        print(f'topic: {topic} ({num_perspectives} perspectives)')
         await ctx.set('topic', topic)
+        await ctx.set('stance_types', stance_types)
 
         # Initial research to understand the topic
-        tavily_client = TavilyClient()
         sanitized_query = sanitize_search_query(topic)
         print(f'Sanitized search query: "{sanitized_query}"')  # Debug logging
-        response = tavily_client.search(sanitized_query)
-        source_materials = '\n'.join(result['content'] for result in response['results'])
-        initial_urls = [result['url'] for result in response['results']]
+        source_materials, initial_urls, _ = await self._search(sanitized_query)
         await ctx.set('initial_urls', initial_urls)
 
         # Use LLM to identify the stances
@@ -77,7 +199,8 @@ class DebateResearchWorkflow(Workflow):
             model="gpt-4o",
             temperature=0.3
         )
-        prompt = f'''Given this debate topic '{topic}' and these initial materials: {source_materials}
+        if num_perspectives == 2:
+            prompt = f'''Given this debate topic '{topic}' and these initial materials: {source_materials}
                     Generate two clear opposing stances - one for and one against the topic.
                     Each stance should be a clear position statement, not longer than 15 words.
                     
@@ -86,62 +209,113 @@ class DebateResearchWorkflow(Workflow):
                         "stance_for": "your for stance here",
                         "stance_against": "your against stance here"
                     }}'''
+        else:
+            prompt = f'''Given this debate topic '{topic}' and these initial materials: {source_materials}
+                    Generate {num_perspectives} clearly distinct stances on the topic. If the topic compares
+                    options (for example several products), give each real option its own stance.
+                    Each stance should be a clear position statement, not longer than 15 words.
+                    
+                    IMPORTANT: Return ONLY a valid JSON object in this exact format, with no additional text:
+                    {{
+                        "stances": ["first stance here", "second stance here", ...]
+                    }}'''
         
-        response = llm.complete(prompt)
-        try:
-            stances = json.loads(response.text)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract the JSON part from the response
-            import re
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            if json_match:
-                stances = json.loads(json_match.group(0))
-            else:
-                # If we can't extract JSON, create a default response
-                stances = {
-                    "stance_for": "Supporting the topic",
-                    "stance_against": "Opposing the topic"
-                }
+        check_cancelled(self.cancel_token)
+        response = await llm.acomplete(prompt)
+        parsed = parse_json_response(response.text) or {}
+        if num_perspectives == 2:
+            stances = [
+                parsed.get("stance_for") or f"In favour: {topic}",
+                parsed.get("stance_against") or f"Against: {topic}"
+            ]
+        else:
+            stances = await self._complete_stances(
+                llm, topic, _distinct_stances(parsed.get("stances", [])), num_perspectives
+            )
         
-        # Send events for both stances
-        ctx.send_event(StancePackage(stance=stances["stance_for"], stance_type="for"))
-        ctx.send_event(StancePackage(stance=stances["stance_against"], stance_type="against"))
+        # Send one event per stance; research workers pick them up concurrently
+        for stance_type, stance in zip(stance_types, stances):
+            ctx.send_event(StancePackage(stance=stance, stance_type=stance_type))
+
+    async def _complete_stances(self, llm, topic: str, stances: List[str], num_perspectives: int, attempts: int = 2) -> List[str]:
+        """
+        Ask again for the stances the first answer was missing; any still missing are built
+        from the topic, so every stance researched is a real query about it.
+        """
+        for _ in range(attempts):
+            missing = num_perspectives - len(stances)
+            if missing <= 0:
+                break
+            print(f"Warning: Got {len(stances)} of {num_perspectives} stances; asking for {missing} more")
+            taken = '\n                    '.join(f"- {stance}" for stance in stances)
+            prompt = f'''For the debate topic '{topic}' we already have these stances:
+                    {taken}
+                    Generate {missing} more stances on the topic, each clearly distinct from the ones above
+                    and from each other. Each stance should be a clear position statement, not longer than 15 words.
 
-    @step(num_workers=2)
+                    IMPORTANT: Return ONLY a valid JSON object in this exact format, with no additional text:
+                    {{
+                        "stances": ["first new stance here", ...]
+                    }}'''
+            check_cancelled(self.cancel_token)
+            response = await llm.acomplete(prompt)
+            extra = (parse_json_response(response.text) or {}).get("stances", [])
+            stances = _distinct_stances(stances + list(extra if isinstance(extra, list) else []))
+
+        angles = iter(FALLBACK_STANCE_ANGLES)
+        while len(stances) < num_perspectives:
+            print("Warning: Filling a missing stance from the topic")
+            stances = _distinct_stances(stances + [next(angles).format(topic=topic)])
+        return stances[:num_perspectives]
+
+    @step(num_workers=MAX_PERSPECTIVES)
     async def research_stance(self, ctx: Context, ev: StancePackage) -> StanceSourceMaterialPackage:
         stance = ev.stance
         stance_type = ev.stance_type
         
-        tavily_client = TavilyClient()
-        response = tavily_client.search(sanitize_search_query(stance))
-        stance_materials = '\n'.join(result['content'] for result in response['results'])
-        stance_urls = [result['url'] for result in response['results']]
+        query = sanitize_search_query(stance)
+        stance_materials, stance_urls, fresh = await self._search(query)
+        
+        # Corpus hits already include page text saved by earlier runs that read the pages
+        if self.page_fetcher and fresh:
+            # Read the cited pages themselves for richer material than the search snippets
+            check_cancelled(self.cancel_token)
+            pages = await self.page_fetcher.fetch_all(stance_urls)
+            for url, text in pages.items():
+                stance_materials += f"\n\nFull text from {url}:\n{text[:MAX_PAGE_CHARS]}"
+            if self.corpus is not None and pages:
+                await asyncio.to_thread(self.corpus.add_documents, [
+                    {"url": url, "text": text, "query": query} for url, text in pages.items()
+                ], self.corpus_run)
         
         return StanceSourceMaterialPackage(
             stance_source_materials=stance_materials,
             urls=stance_urls,
-            stance_type=stance_type
+            stance_type=stance_type,
+            stance=stance
         )
 
     @step
     async def combine_stance_research(self, ctx: Context, ev: StanceSourceMaterialPackage) -> EssayTask:
-        source_materials = ctx.collect_events(ev, [StanceSourceMaterialPackage] * 2)
+        stance_types = await ctx.get('stance_types')
+        source_materials = ctx.collect_events(ev, [StanceSourceMaterialPackage] * len(stance_types))
         if source_materials is None:
             return None
 
         # Get topic
         topic = await ctx.get('topic')
 
-        # Send essay tasks for both stances
+        # Send essay tasks for every stance
         for material in source_materials:
             ctx.send_event(EssayTask(
                 source_materials=material.stance_source_materials,
                 urls=material.urls,
                 stance_type=material.stance_type,
+                stance=material.stance,
                 topic=topic
             ))
 
-    @step(num_workers=2)
+    @step(num_workers=MAX_PERSPECTIVES)
     async def write_stance_essay(self, ctx: Context, ev: EssayTask) -> StanceEssayPackage:
         llm = AzureOpenAI(
             engine="gpt-4o-mini",
@@ -150,7 +324,14 @@ class DebateResearchWorkflow(Workflow):
             max_tokens=10000
         )
         
-        prompt = f'''You are writing a persuasive essay {ev.stance_type} this topic: {ev.topic}
+        if ev.stance_type in ("for", "against"):
+            position = f"{ev.stance_type} this topic: {ev.topic}"
+            position_short = f"{ev.stance_type} the topic"
+        else:
+            position = f"on this topic: {ev.topic}, arguing this position: {ev.stance}"
+            position_short = ev.stance
+        
+        prompt = f'''You are writing a persuasive essay {position}
                     Use these source materials to support your argument: {ev.source_materials}
                     
                     First, identify your three main arguments. Each should be summarized in 3-5 words.
@@ -159,7 +340,7 @@ class DebateResearchWorkflow(Workflow):
                     # Introduction
                     [First paragraph: Present the topic and its significance]
                     
-                    [Second paragraph: Clearly state your position ({ev.stance_type} the topic)]
+                    [Second paragraph: Clearly state your position ({position_short})]
 
                     # Main Arguments
 
@@ -195,33 +376,41 @@ class DebateResearchWorkflow(Workflow):
                     
                     Write the essay now, following this structure and formatting exactly.'''
                     
-        response = await llm.acomplete(prompt)
+        # Stream tokens out to listeners while accumulating the full essay
+        essay = ''
+        check_cancelled(self.cancel_token)
+        response_gen = await llm.astream_complete(prompt)
+        async for chunk in response_gen:
+            # Stop consuming (and so close) the stream as soon as nobody is waiting for the essay
+            check_cancelled(self.cancel_token)
+            if chunk.delta:
+                essay += chunk.delta
+                ctx.write_event_to_stream(EssayChunk(stance_type=ev.stance_type, delta=chunk.delta))
         
         return StanceEssayPackage(
-            essay=str(response),
+            essay=essay,
             stance_type=ev.stance_type,
+            stance=ev.stance,
             reference_urls=ev.urls
         )
 
     @step
     async def finalize_essays(self, ctx: Context, ev: StanceEssayPackage) -> StopEvent:
-        essays = ctx.collect_events(ev, [StanceEssayPackage] * 2)
+        stance_types = await ctx.get('stance_types')
+        essays = ctx.collect_events(ev, [StanceEssayPackage] * len(stance_types))
         if essays is None:
             return None
             
-        # Combine essays into final result
-        essay_for = next(e for e in essays if e.stance_type == "for")
-        essay_against = next(e for e in essays if e.stance_type == "against")
+        # Combine essays into final result, keyed by stance type in stance order
+        essays_by_type = {e.stance_type: e for e in essays}
         
         return StopEvent(result={
-            "for": {
-                "essay": essay_for.essay,
-                "references": essay_for.reference_urls
-            },
-            "against": {
-                "essay": essay_against.essay,
-                "references": essay_against.reference_urls
+            stance_type: {
+                "stance": essays_by_type[stance_type].stance,
+                "essay": essays_by_type[stance_type].essay,
+                "references": essays_by_type[stance_type].reference_urls
             }
+            for stance_type in stance_types
         })
 
 def sanitize_search_query(query: str) -> str:
@@ -247,28 +436,62 @@ def sanitize_search_query(query: str) -> str:
         
     return query
 
-async def research_debate_topic(topic: str) -> Dict:
+async def research_debate_topic(
+    topic: str,
+    run_id: Optional[str] = None,
+    on_essay_token: Optional[Callable[[str, str], None]] = None,
+    num_perspectives: int = 2,
+    fetch_pages: bool = False,
+    use_corpus: bool = True,
+    cancel_token: Optional[CancellationToken] = None
+) -> Dict:
     """
-    Research a debate topic and generate essays for both stances.
-    Returns a dictionary containing both essays and their references.
+    Research a debate topic and generate one essay per perspective.
+    Returns a dictionary keyed by stance type ("for"/"against", or "perspective_<n>" when
+    `num_perspectives` > 2), each holding the stance, its essay and references.
+    Essays are saved into the artifact store under `run_id` (a new run if not given).
+    If `on_essay_token` is given it is called with (stance_type, delta) as essay tokens arrive.
+    With `fetch_pages` the cited pages are read too, not just their search snippets.
+    With `use_corpus` material from earlier runs can stand in for or supplement web searches.
+    Raises RunCancelled, leaving in-flight calls aborted, once `cancel_token` is cancelled.
     """
-    os.makedirs('output', exist_ok=True)
+    stance_types_for(num_perspectives)  # Validate before starting any work
+    store, run_id = resolve_run(topic, run_id)
     
-    w = DebateResearchWorkflow(timeout=10000, verbose=False)
-    result = await w.run(query=topic)
+    w = DebateResearchWorkflow(
+        timeout=10000,
+        verbose=False,
+        fetch_pages=fetch_pages,
+        use_corpus=use_corpus,
+        cancel_token=cancel_token
+    )
+    handler = w.run(query=topic, num_perspectives=num_perspectives)
+
+    async def run_workflow():
+        try:
+            async for ev in handler.stream_events():
+                if isinstance(ev, EssayChunk) and on_essay_token:
+                    on_essay_token(ev.stance_type, ev.delta)
+            return await handler
+        except asyncio.CancelledError:
+            # Take the step workers down with us rather than leaving them running
+            await handler.cancel_run()
+            raise
+
+    result = await run_cancellable(run_workflow(), cancel_token)
     
     # Save essays to markdown files
-    for stance in ["for", "against"]:
-        essay = result[stance]["essay"]
-        references = result[stance]["references"]
+    for stance, stance_result in result.items():
+        essay = stance_result["essay"]
+        references = stance_result["references"]
         
-        markdown_content = f"# {topic.title()} - {stance.title()} Stance\n\n"
-        markdown_content += f"{essay}\n\n## References\n"
+        markdown_content = f"# {topic.title()} - {stance_label(stance)} Stance\n\n"
+        markdown_content += f"_{stance_result['stance']}_\n\n{essay}\n\n## References\n"
         for i, url in enumerate(references, 1):
             markdown_content += f"{i}. {url}\n"
             
-        filename = f"output/{topic.replace(' ', '_').lower()}_{stance}_stance.md"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
+        store.write_text(run_id, f"{stance}_stance.md", markdown_content)
+    # Machine-readable copy so the debate can be reloaded for a similar topic later
+    store.write_json(run_id, "research.json", result)
     
-    return result 
\ No newline at end of file
+    return result
\ No newline at end of file
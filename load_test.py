@@ -0,0 +1,541 @@
+"""
+Load and soak test harness for the debate pipeline.
+
+Simulates many users pressing "Fight!!!" at once: each session runs the same stages as
+app.py (research, illustration, script, audio) on its own thread with its own event loop,
+the way Streamlit runs one script thread per session. Search, LLM, image and speech
+providers are replaced with local fakes that add configurable latency (speech is faked at
+the Azure SDK boundary, so the real synthesizer pools, pacing, shards and router run), so
+the run measures our own code: throughput, latency percentiles, memory growth, event loop stalls, and
+whether any session ended up with another session's content.
+
+Usage:
+    python load_test.py --sessions 50 --concurrency 25
+    python load_test.py --concurrency 20 --duration 600   # soak for 10 minutes
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import wave
+import array
+import random
+import asyncio
+import shutil
+import argparse
+import tempfile
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# The pipeline modules copy these into the OpenAI client's variables at import time; every
+# provider is faked here, so placeholders are enough on a machine without credentials
+os.environ.setdefault("AZURE_OPENAI_KEY", "load-test-key")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://load-test.invalid")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-02-01")
+
+import artifact_store
+import debate_research_workflow
+import podcast_script_generator
+import debate_illustrator
+import tts_backends
+from artifact_store import ArtifactStore, set_artifact_store
+from debate_research_workflow import research_debate_topic
+from podcast_script_generator import generate_podcast_script, DEBATER_ROSTER
+from podcast_audio_recorder import PodcastAudioRecorder
+from debate_illustrator import generate_debate_illustration
+from tts_backends import TTSRouter, create_azure_backend, SAMPLE_RATE, SAMPLE_WIDTH, CHANNELS
+from azure.cognitiveservices.speech import ResultReason, CancellationReason, CancellationErrorCode
+
+# Which session the current code is running for; copied into tasks and to_thread calls,
+# so the fakes can stamp everything they produce with the session that asked for it.
+current_session = contextvars.ContextVar('current_session', default=0)
+
+def session_marker(session_id: int) -> str:
+    return f"<session-{session_id}>"
+
+class LatencyModel:
+    """Provider latencies in seconds, with a little jitter."""
+
+    def __init__(self, search: float, llm: float, image: float, tts: float, jitter: float = 0.2):
+        self.search = search
+        self.llm = llm
+        self.image = image
+        self.tts = tts
+        self.jitter = jitter
+
+    def sample(self, base: float) -> float:
+        return max(0.0, base * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+LATENCY = LatencyModel(search=0.3, llm=0.5, image=1.0, tts=0.2)
+
+# ---------------------------------------------------------------------- fakes
+
+class FakeTavilyClient:
+    """Async, like the real AsyncTavilyClient."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def search(self, query: str) -> Dict:
+        await asyncio.sleep(LATENCY.sample(LATENCY.search))
+        marker = session_marker(current_session.get())
+        return {"results": [
+            {"url": f"https://example.com/{i}", "content": f"{marker} Source {i} about {query}."}
+            for i in range(5)
+        ]}
+
+class FakeCompletion:
+    def __init__(self, text: str):
+        self.text = text
+        self.delta = text
+
+    def __str__(self):
+        return self.text
+
+class FakeLLM:
+    """Stands in for llama_index's AzureOpenAI; answers based on which prompt it got."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _respond(self, prompt: str) -> str:
+        marker = session_marker(current_session.get())
+
+        if '"stances"' in prompt:
+            count = int(re.search(r'Generate (\d+) clearly distinct stances', prompt).group(1))
+            return json.dumps({"stances": [f"{marker} option {i} is best" for i in range(1, count + 1)]})
+        if '"stance_for"' in prompt:
+            return json.dumps({"stance_for": f"{marker} yes", "stance_against": f"{marker} no"})
+        if 'persuasive essay' in prompt:
+            return '\n\n'.join([
+                f"# Introduction\n{marker} Why this matters.",
+                "# Main Arguments",
+                *[f"## Key Point {n}: Point {n}\n{marker} Evidence {n}." for n in (1, 2, 3)],
+                f"# Addressing Counter-Arguments\n{marker} Rebuttal.",
+                f"# Conclusion\n{marker} Summary."
+            ])
+        if 'DALL-E prompt' in prompt:
+            return f"{marker} a debate stage"
+
+        # Script prompts: one line per role mentioned in the prompt
+        roles = list(dict.fromkeys(re.findall(r'\[([A-Z][A-Z .]*)\]:', prompt)))
+        return '\n'.join(f"[{role}]: {marker} {role.lower()} speaking." for role in roles)
+
+    def complete(self, prompt: str) -> FakeCompletion:
+        time.sleep(LATENCY.sample(LATENCY.llm))
+        return FakeCompletion(self._respond(prompt))
+
+    async def acomplete(self, prompt: str) -> FakeCompletion:
+        await asyncio.sleep(LATENCY.sample(LATENCY.llm))
+        return FakeCompletion(self._respond(prompt))
+
+    async def astream_complete(self, prompt: str):
+        text = self._respond(prompt)
+        words = text.split(' ')
+        delay = LATENCY.sample(LATENCY.llm) / max(len(words), 1)
+
+        async def stream():
+            for i, word in enumerate(words):
+                await asyncio.sleep(delay)
+                yield FakeCompletion(word if i == 0 else ' ' + word)
+        return stream()
+
+class FakeImages:
+    async def generate(self, prompt: str, **kwargs):
+        await asyncio.sleep(LATENCY.sample(LATENCY.image))
+
+        class Image:
+            url = f"https://images.example.com/{current_session.get()}.png"
+
+        class Response:
+            data = [Image()]
+        return Response()
+
+class FakeOpenAI:
+    def __init__(self, *args, **kwargs):
+        self.images = FakeImages()
+
+async def fake_download_image(url: str) -> Optional[bytes]:
+    await asyncio.sleep(LATENCY.sample(LATENCY.search))
+    return b'\x89PNG fake ' + session_marker(current_session.get()).encode()
+
+def session_sample_value(session_id: int) -> int:
+    return session_id % 30000 + 1
+
+class FakeSpeechConfig:
+    """Stands in for the Speech SDK's SpeechConfig; the pool sets the voice on it."""
+
+    def __init__(self, subscription: str = None, region: str = None, **kwargs):
+        self.region = region
+        self.speech_synthesis_voice_name = None
+
+    def set_speech_synthesis_output_format(self, output_format):
+        pass
+
+class FakeSynthesisResult:
+    def __init__(self, reason, audio_data: bytes = b'', cancellation_details=None):
+        self.reason = reason
+        self.audio_data = audio_data
+        self.cancellation_details = cancellation_details
+
+class FakeCancellationDetails:
+    reason = CancellationReason.Error
+    error_code = CancellationErrorCode.TooManyRequests
+    error_details = "Fake speech resource is rate limited"
+
+class FakeSpeechSynthesizer:
+    """
+    Stands in for the Speech SDK's SpeechSynthesizer, underneath the real synthesizer pool,
+    pacing, shards and router. Audio is a WAV whose every sample is the session's id, so
+    mixing is detectable; a synthesizer used by two lines at once is counted as an overlap.
+    """
+
+    overlaps = 0
+    throttle_rate = 0.0
+    _overlaps_lock = threading.Lock()
+
+    def __init__(self, speech_config: FakeSpeechConfig = None, audio_config=None):
+        self.speech_config = speech_config
+        self._busy = threading.Lock()
+
+    def _speak(self, text: str) -> FakeSynthesisResult:
+        if not self._busy.acquire(blocking=False):
+            with FakeSpeechSynthesizer._overlaps_lock:
+                FakeSpeechSynthesizer.overlaps += 1
+            self._busy.acquire()
+        try:
+            time.sleep(LATENCY.sample(LATENCY.tts))
+            if random.random() < self.throttle_rate:
+                return FakeSynthesisResult(ResultReason.Canceled, cancellation_details=FakeCancellationDetails())
+
+            samples = array.array('h', [session_sample_value(current_session.get())] * (len(text) * 10))
+            audio = io.BytesIO()
+            with wave.open(audio, 'wb') as wav:
+                wav.setnchannels(CHANNELS)
+                wav.setsampwidth(SAMPLE_WIDTH)
+                wav.setframerate(SAMPLE_RATE)
+                wav.writeframes(samples.tobytes())
+            return FakeSynthesisResult(ResultReason.SynthesizingAudioCompleted, audio.getvalue())
+        finally:
+            self._busy.release()
+
+    def speak_text_async(self, text: str):
+        synthesizer = self
+
+        class Future:
+            def get(self):
+                return synthesizer._speak(text)
+        return Future()
+
+class FakeConnection:
+    @staticmethod
+    def from_speech_synthesizer(synthesizer: FakeSpeechSynthesizer) -> "FakeConnection":
+        return FakeConnection()
+
+    def open(self, for_continuous_recognition: bool):
+        pass
+
+    def close(self):
+        pass
+
+def install_fakes(speech_shards: int = 2, tts_throttle_rate: float = 0.0):
+    """Swap every external provider for a local fake."""
+    # Fake speech resources, so the backends shard lines over them as they would in production
+    os.environ["AZURE_SPEECH_SHARDS"] = ','.join(
+        f"load-test-key-{i}@load-test-region-{i}" for i in range(speech_shards)
+    )
+    FakeSpeechSynthesizer.throttle_rate = tts_throttle_rate
+    debate_research_workflow.AsyncTavilyClient = FakeTavilyClient
+    debate_research_workflow.AzureOpenAI = FakeLLM
+    podcast_script_generator.AzureOpenAI = FakeLLM
+    debate_illustrator.AzureOpenAI = FakeLLM
+    debate_illustrator.oai = FakeOpenAI
+    debate_illustrator.download_image = fake_download_image
+    tts_backends.SpeechConfig = FakeSpeechConfig
+    tts_backends.SpeechSynthesizer = FakeSpeechSynthesizer
+    tts_backends.Connection = FakeConnection
+
+# -------------------------------------------------------------------- session
+
+class EventLoopMonitor:
+    """Measures how late a periodic timer fires: large values mean something blocked the loop."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.max_stall = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_stall = max(self.max_stall, time.perf_counter() - start - self.interval)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+async def monitored(coro, monitor_stalls: List[float]):
+    monitor = EventLoopMonitor()
+    monitor.start()
+    try:
+        return await coro
+    finally:
+        monitor.stop()
+        monitor_stalls.append(monitor.max_stall)
+
+def run_session(session_id: int, topic: str, num_perspectives: int) -> Dict:
+    """One user's full pipeline, mirroring app.py (one asyncio.run per stage)."""
+    current_session.set(session_id)
+    stalls: List[float] = []
+    stages: Dict[str, float] = {}
+    record = {"session": session_id, "topic": topic, "ok": False, "stages": stages}
+    start = time.perf_counter()
+
+    try:
+        run_id = artifact_store.get_artifact_store().create_run(topic)
+        record["run_id"] = run_id
+
+        stage_start = time.perf_counter()
+        result = asyncio.run(monitored(research_debate_topic(
+            topic,
+            run_id=run_id,
+            on_essay_token=lambda stance, delta: None,
+            num_perspectives=num_perspectives,
+            # Reusing other sessions' research is by design, but would look like corruption here
+            use_corpus=False
+        ), stalls))
+        stages["research"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        asyncio.run(monitored(generate_debate_illustration(
+            topic=topic,
+            for_stance="",
+            against_stance="",
+            run_id=run_id,
+            debater_roles=[debater["role"] for debater in DEBATER_ROSTER[:num_perspectives]]
+        ), stalls))
+        stages["illustration"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        script_data = asyncio.run(monitored(generate_podcast_script(
+            topic=topic,
+            run_id=run_id,
+            parallel=True,
+            perspectives=[
+                {"stance_type": stance, "stance": stance_result["stance"], "essay": stance_result["essay"]}
+                for stance, stance_result in result.items()
+            ]
+        ), stalls))
+        stages["script"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        # The real Azure path (router, shards, pacing, shared synthesizer pools) over the fake
+        # SDK. No offline overflow: its audio couldn't be told apart from another session's
+        recorder = PodcastAudioRecorder(backend=TTSRouter(create_azure_backend()))
+        asyncio.run(monitored(recorder.generate_podcast_audio(script_data, run_id=run_id), stalls))
+        stages["audio"] = time.perf_counter() - stage_start
+
+        record["ok"] = True
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+
+    record["latency"] = time.perf_counter() - start
+    record["max_loop_stall"] = max(stalls, default=0.0)
+    return record
+
+def check_session_artifacts(store: ArtifactStore, record: Dict) -> List[str]:
+    """Return problems found in a session's artifacts (missing files or foreign content)."""
+    problems = []
+    run_dir = store.run_dir(record["run_id"])
+    own = session_marker(record["session"])
+
+    for name in sorted(os.listdir(run_dir)):
+        path = os.path.join(run_dir, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if name.endswith('.wav'):
+            with wave.open(io.BytesIO(data), 'rb') as wav:
+                samples = array.array('h', wav.readframes(wav.getnframes()))
+            expected = session_sample_value(record["session"])
+            foreign = sum(1 for sample in samples if sample != expected)
+            if foreign:
+                problems.append(f"{name}: {foreign} samples from other sessions")
+        else:
+            text = data.decode('utf-8', errors='replace')
+            markers = set(re.findall(r'<session-\d+>', text))
+            if own not in markers:
+                problems.append(f"{name}: missing own content")
+            if markers - {own}:
+                problems.append(f"{name}: content from {sorted(markers - {own})}")
+
+    expected_files = {"podcast.wav", "podcast_script.json", "debate_illustration.png"}
+    missing = expected_files - set(os.listdir(run_dir))
+    if missing:
+        problems.append(f"missing artifacts: {sorted(missing)}")
+    return problems
+
+# -------------------------------------------------------------------- metrics
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux), falling back to peak RSS elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def summarize(records: List[Dict], elapsed: float, memory_samples: List[int], problems: Dict[int, List[str]]) -> Dict:
+    ok = [r for r in records if r["ok"]]
+    latencies = [r["latency"] for r in ok]
+    stage_names = sorted({stage for r in ok for stage in r["stages"]})
+    return {
+        "sessions": len(records),
+        "succeeded": len(ok),
+        "failed": len(records) - len(ok),
+        "errors": sorted({r["error"] for r in records if not r["ok"]}),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_sessions_per_min": round(len(ok) / elapsed * 60, 2) if elapsed else 0.0,
+        "latency_s": {
+            f"p{p}": round(percentile(latencies, p), 3) for p in (50, 90, 95, 99)
+        },
+        "stage_p95_s": {
+            stage: round(percentile([r["stages"][stage] for r in ok if stage in r["stages"]], 95), 3)
+            for stage in stage_names
+        },
+        "max_event_loop_stall_s": round(max((r["max_loop_stall"] for r in records), default=0.0), 3),
+        "memory_mb": {
+            "start": round(memory_samples[0] / 2**20, 1),
+            "end": round(memory_samples[-1] / 2**20, 1),
+            "peak": round(max(memory_samples) / 2**20, 1),
+            "growth": round((memory_samples[-1] - memory_samples[0]) / 2**20, 1)
+        },
+        "corrupted_sessions": {str(session): issues for session, issues in problems.items()}
+    }
+
+# ------------------------------------------------------------------------ run
+
+def run_load_test(
+    sessions: int,
+    concurrency: int,
+    distinct_topics: int,
+    num_perspectives: int,
+    duration: Optional[float] = None,
+    speech_shards: int = 2,
+    tts_throttle_rate: float = 0.0,
+    keep_artifacts: bool = False
+) -> Dict:
+    install_fakes(speech_shards, tts_throttle_rate)
+    store = ArtifactStore(root=tempfile.mkdtemp(prefix='load_test_'))
+    set_artifact_store(store)
+
+    topics = [f"Should I buy gadget number {i}?" for i in range(distinct_topics)]
+    records: List[Dict] = []
+    memory_samples = [rss_bytes()]
+    lock = threading.Lock()
+    counter = iter(range(1, sys.maxsize))
+
+    def worker():
+        # In soak mode keep starting sessions until the deadline; otherwise stop at `sessions`
+        while True:
+            with lock:
+                session_id = next(counter)
+                if duration is None and session_id > sessions:
+                    return
+                if duration is not None and time.perf_counter() > deadline:
+                    return
+            record = run_session(session_id, topics[session_id % len(topics)], num_perspectives)
+            with lock:
+                records.append(record)
+                memory_samples.append(rss_bytes())
+                if len(records) % max(1, concurrency) == 0:
+                    print(f"{len(records)} sessions done, RSS {memory_samples[-1] / 2**20:.1f} MB")
+
+    start = time.perf_counter()
+    deadline = start + duration if duration is not None else None
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='session') as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    problems = {}
+    for record in records:
+        if record["ok"]:
+            issues = check_session_artifacts(store, record)
+            if issues:
+                problems[record["session"]] = issues
+
+    report = summarize(records, elapsed, memory_samples, problems)
+    report["artifact_store_mb"] = round(store.total_bytes() / 2**20, 2)
+    report["speech_synthesizer_overlaps"] = FakeSpeechSynthesizer.overlaps
+    report["speech_shard_lines"] = {
+        shard.label: shard.lines for shard in tts_backends._speech_shards.values()
+    }
+    if keep_artifacts:
+        report["artifact_root"] = store.root
+    else:
+        shutil.rmtree(store.root, ignore_errors=True)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent multi-session load/soak test with local service fakes")
+    parser.add_argument('--sessions', type=int, default=20, help="Total sessions to run (ignored with --duration)")
+    parser.add_argument('--concurrency', type=int, default=10, help="Sessions running at the same time")
+    parser.add_argument('--duration', type=float, help="Soak mode: keep running sessions for this many seconds")
+    parser.add_argument('--distinct-topics', type=int, default=3, help="Fewer topics than sessions exercises same-topic collisions")
+    parser.add_argument('--perspectives', type=int, default=2)
+    parser.add_argument('--search-latency', type=float, default=LATENCY.search)
+    parser.add_argument('--llm-latency', type=float, default=LATENCY.llm)
+    parser.add_argument('--image-latency', type=float, default=LATENCY.image)
+    parser.add_argument('--tts-latency', type=float, default=LATENCY.tts)
+    parser.add_argument('--speech-shards', type=int, default=2, help="Fake Azure Speech resources to shard lines over")
+    parser.add_argument('--tts-throttle-rate', type=float, default=0.0, help="Share of speech requests answered with a 429")
+    parser.add_argument('--keep-artifacts', action='store_true', help="Keep the scratch artifact store for inspection")
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args()
+
+    LATENCY.search = args.search_latency
+    LATENCY.llm = args.llm_latency
+    LATENCY.image = args.image_latency
+    LATENCY.tts = args.tts_latency
+
+    report = run_load_test(
+        sessions=args.sessions,
+        concurrency=args.concurrency,
+        distinct_topics=args.distinct_topics,
+        num_perspectives=args.perspectives,
+        duration=args.duration,
+        speech_shards=args.speech_shards,
+        tts_throttle_rate=args.tts_throttle_rate,
+        keep_artifacts=args.keep_artifacts
+    )
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    # Non-zero exit when sessions fail or leak into each other, so this can gate CI
+    if report["failed"] or report["corrupted_sessions"] or report["speech_synthesizer_overlaps"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import re
+import time
+import codecs
+import socket
+import asyncio
+import ipaddress
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Dict, Iterable, Optional
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.compat import chardet
+
+USER_AGENT = "Mozilla/5.0 (compatible; ForMyWifeResearchBot/1.0)"
+
+# Tags whose text is never part of an article's main content
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'svg', 'iframe', 'button', 'template'}
+# Tags that hold running text worth keeping
+TEXT_TAGS = {'p', 'li', 'h1', 'h2', 'h3', 'h4', 'blockquote', 'pre', 'td'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.IGNORECASE)
+
+class TransientFetchError(Exception):
+    """A fetch failed in a way that may work next time (timeout, server error); not cached."""
+
+class _MainTextParser(HTMLParser):
+    """Collects paragraph-like text, preferring <article>/<main> content when the page has it."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.text_depth = 0
+        self.current = []
+        self.blocks = []       # (text, inside_main)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in ('article', 'main'):
+            self.main_depth += 1
+        elif tag in TEXT_TAGS:
+            if self.text_depth == 0:
+                self.current = []
+            self.text_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in ('article', 'main'):
+            self.main_depth = max(0, self.main_depth - 1)
+        elif tag in TEXT_TAGS and self.text_depth:
+            self.text_depth -= 1
+            if self.text_depth == 0:
+                text = ' '.join(''.join(self.current).split())
+                if text:
+                    self.blocks.append((text, self.main_depth > 0))
+
+    def handle_data(self, data):
+        if self.text_depth and not self.skip_depth:
+            self.current.append(data)
+
+def extract_main_text(html: str, min_block_words: int = 6) -> str:
+    """Extract the readable body text of an HTML page, dropping navigation, scripts and boilerplate."""
+    parser = _MainTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass  # Keep whatever was parsed before malformed markup
+
+    blocks = parser.blocks
+    if any(in_main for _, in_main in blocks):
+        blocks = [block for block in blocks if block[1]]
+    # Very short blocks are mostly menus, captions and buttons
+    return '\n\n'.join(text for text, _ in blocks if len(text.split()) >= min_block_words)
+
+def is_public_host(host: str) -> bool:
+    """True if every address `host` resolves to is publicly routable (not private, loopback, link-local, ...)."""
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise TransientFetchError(f"Can't resolve {host}") from e
+    for info in infos:
+        # Strip an IPv6 zone id ("fe80::1%eth0")
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if not address.is_global or address.is_multicast:
+            return False
+    return bool(infos)
+
+def _detect_encoding(response: requests.Response, body: bytes) -> str:
+    # requests falls back to ISO-8859-1 for text/* without a charset, which garbles most pages
+    if 'charset=' in response.headers.get('Content-Type', '').lower() and response.encoding:
+        return response.encoding
+    match = META_CHARSET.search(body[:4096])
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+    # What requests' apparent_encoding does, on the bytes we kept (the stream is already read)
+    return (chardet.detect(body) or {}).get('encoding') or 'utf-8'
+
+class ResponseCache:
+    """Thread-safe LRU cache of extracted page text with a time-to-live, shared by all runs."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 6 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str):
+        """Return (hit, text); text is None for pages that previously failed."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return False, None
+            stored_at, text = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[url]
+                return False, None
+            self._entries.move_to_end(url)
+            return True, text
+
+    def put(self, url: str, text: Optional[str]):
+        with self._lock:
+            self._entries[url] = (time.time(), text)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+_shared_cache = ResponseCache()
+_thread_local = threading.local()
+
+def _session() -> requests.Session:
+    # requests.Session isn't thread-safe, so each worker thread keeps its own connection pool
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers['User-Agent'] = USER_AGENT
+        _thread_local.session = session
+    return session
+
+class PageFetcher:
+    """
+    Fetches cited pages concurrently and returns their main text.
+
+    Concurrency is bounded overall and per host, every fetch has a total timeout and a
+    download size cap, and results are cached across runs. Pages that can't be used
+    (404s, non-text content) are cached as failures; timeouts, connection errors and
+    server errors are not, so the page is tried again next time. Only public hosts are
+    fetched, redirects included, unless `allow_private_hosts` is set.
+    Create one per event loop; the cache is shared process-wide.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        per_host_limit: int = 2,
+        timeout: float = 10.0,
+        max_bytes: int = 2 * 1024 * 1024,
+        max_redirects: int = 5,
+        allow_private_hosts: bool = False,
+        cache: Optional[ResponseCache] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_redirects = max_redirects
+        self.allow_private_hosts = allow_private_hosts
+        self.cache = cache or _shared_cache
+        self._semaphore = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _allowed(self, url: str) -> bool:
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            return False
+        return self.allow_private_hosts or is_public_host(parsed.hostname)
+
+    def _remaining(self, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TransientFetchError("Timed out")
+        return remaining
+
+    def _download(self, url: str, deadline: float) -> Optional[str]:
+        """
+        Blocking download capped at max_bytes and finished by `deadline` (time.monotonic());
+        returns decoded HTML/text, None for pages that can't be used, and raises for
+        failures worth retrying later.
+        """
+        # Redirects are followed by hand so every hop's host is checked
+        for _ in range(self.max_redirects + 1):
+            if not self._allowed(url):
+                print(f"Not fetching {url}: not a public web address")
+                return None
+
+            remaining = self._remaining(deadline)
+            with _session().get(url, stream=True, allow_redirects=False, timeout=(min(5.0, remaining), remaining)) as response:
+                if response.status_code in REDIRECT_STATUSES and response.headers.get('Location'):
+                    url = urljoin(url, response.headers['Location'])
+                    continue
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise TransientFetchError(f"HTTP {response.status_code}")
+                if response.status_code != 200:
+                    return None
+                content_type = response.headers.get('Content-Type', '')
+                if content_type and not content_type.startswith(('text/html', 'text/plain', 'application/xhtml')):
+                    return None
+
+                chunks = []
+                size = 0
+                # The read timeout restarts with every chunk, so a slow trickle needs its own bound
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    self._remaining(deadline)
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.max_bytes:
+                        break
+                body = b''.join(chunks)[:self.max_bytes]
+                encoding = _detect_encoding(response, body)
+
+            text = body.decode(encoding, errors='replace')
+            if content_type.startswith('text/plain'):
+                return text
+            return extract_main_text(text)
+
+        print(f"Not fetching {url}: too many redirects")
+        return None
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """Main text of one page, or None if it can't be fetched in time."""
+        hit, text = self.cache.get(url)
+        if hit:
+            return text
+
+        host = urlparse(url).netloc
+        if not host:
+            return None
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        host_semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+
+        async with self._semaphore, host_semaphore:
+            deadline = time.monotonic() + self.timeout
+            try:
+                # The download stops itself at the deadline; wait_for just stops waiting for it
+                text = await asyncio.wait_for(asyncio.to_thread(self._download, url, deadline), self.timeout)
+            except (TransientFetchError, requests.RequestException, OSError, asyncio.TimeoutError) as e:
+                # Worth another try on a later run, so not cached
+                print(f"Failed to fetch {url}: {type(e).__name__}")
+                return None
+            except Exception as e:
+                print(f"Failed to fetch {url}: {type(e).__name__}")
+                text = None
+
+        self.cache.put(url, text or None)
+        return text or None
+
+    async def fetch_all(self, urls: Iterable[str]) -> Dict[str, str]:
+        """Fetch pages concurrently; returns {url: text} for the pages that worked, in input order."""
+        urls = list(dict.fromkeys(urls))
+        texts = await asyncio.gather(*[self.fetch(url) for url in urls])
+        return {url: text for url, text in zip(urls, texts) if text}
+
+async def main():
+    # Try the fetcher against a throwaway local HTTP server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = b'''<html><head><script>var tracking = 1;</script></head><body>
+                <nav><p>Home | Products | About us and other menu entries</p></nav>
+                <article><h1>Switch 2 review</h1>
+                <p>The new console has a larger screen and noticeably faster load times than before.</p>
+                <p>Battery life is roughly the same as the original model in our testing.</p></article>
+                <footer><p>Copyright notice and a long list of legal links here</p></footer>
+                </body></html>'''
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # The demo server is local, which real fetches refuse
+    fetcher = PageFetcher(allow_private_hosts=True)
+    pages = await fetcher.fetch_all([f"{base}/review", f"{base}/other", "http://127.0.0.1:9/unreachable"])
+    for url, text in pages.items():
+        print(f"{url}:\n{text}\n")
+    server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,115 +1,36 @@
 import os
 import json
 import asyncio
-from azure.cognitiveservices.speech import (
-    SpeechConfig, 
-    SpeechSynthesizer, 
-    AudioConfig,
-    ResultReason
-)
 from dotenv import load_dotenv
-from typing import Dict, List
+from typing import Dict, List, Optional
 import wave
 import io
-import time
-from tenacity import retry, stop_after_attempt, wait_exponential
-import random
+import shutil
+import tempfile
+from artifact_store import resolve_run
+from tts_backends import TTSBackend, create_default_backend
+from cancellation import CancellationToken, RunCancelled, check_cancelled, run_cancellable
 
 # Load environment variables
 load_dotenv()
 
 class PodcastAudioRecorder:
-    def __init__(self):
-        """Initialize the audio recorder with Azure Speech configuration."""
-        self.speech_key = os.getenv("AZURE_SUBSCRIPTION_KEY")
-        self.service_region = os.getenv("AZURE_SERVICE_REGION")
-        
-        if not self.speech_key or not self.service_region:
-            raise ValueError("Azure Speech credentials not found in environment variables")
-            
-        self.speech_config = SpeechConfig(
-            subscription=self.speech_key,
-            region=self.service_region
-        )
-        
-        # Rate limiting settings - increase delay and add jitter
-        self.request_delay = 1.0  # Base delay of 1 second
-        self.jitter = 0.5  # Add random jitter of up to 0.5 seconds
-        self.last_request_time = 0
-        self.consecutive_429s = 0  # Track consecutive 429 errors
-        self.max_429_backoff = 30  # Maximum backoff in seconds
-
-    def _wait_for_rate_limit(self):
-        """Ensure we don't exceed rate limits by adding delay between requests."""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        # Calculate delay with jitter and potential backoff
-        base_delay = self.request_delay
-        if self.consecutive_429s > 0:
-            # Exponential backoff when hitting rate limits
-            backoff = min(2 ** self.consecutive_429s, self.max_429_backoff)
-            base_delay += backoff
-        
-        # Add random jitter
-        delay = base_delay + random.uniform(0, self.jitter)
-        
-        if time_since_last < delay:
-            time.sleep(delay - time_since_last)
-        self.last_request_time = time.time()
+    def __init__(self, backend: Optional[TTSBackend] = None, max_concurrent_segments: Optional[int] = None):
+        """
+        Initialize the audio recorder.
+        By default lines go to Azure Speech, overflowing to the offline engine if it is installed.
+        Unless `max_concurrent_segments` is given, as many lines are synthesized at once as the
+        backend has speech resources to spread them over.
+        """
+        self.backend = backend or create_default_backend()
+        self.max_concurrent_segments = max_concurrent_segments or self.backend.parallelism
 
-    @retry(
-        stop=stop_after_attempt(5),  # Increase retry attempts
-        wait=wait_exponential(multiplier=2, min=4, max=30),  # Increase wait times
-        reraise=True
-    )
     async def generate_audio_segment(self, text: str, voice_name: str, output_path: str) -> bool:
-        """Generate audio for a single line of dialogue with retry logic."""
-        # Rate limiting
-        self._wait_for_rate_limit()
-        
-        # Configure speech synthesis for this segment
-        self.speech_config.speech_synthesis_voice_name = voice_name
-        
-        # Create audio configuration for file output
-        audio_config = AudioConfig(filename=output_path)
-        
-        # Create speech synthesizer
-        synthesizer = SpeechSynthesizer(
-            speech_config=self.speech_config,
-            audio_config=audio_config
-        )
-        
-        try:
-            # Generate speech and wait for completion
-            result = synthesizer.speak_text_async(text).get()
-            success = result.reason == ResultReason.SynthesizingAudioCompleted
-            
-            if not success:
-                print(f"Error synthesizing audio: {result.reason}")
-                if result.cancellation_details:
-                    error_details = result.cancellation_details
-                    print(f"Error details: {error_details.reason}")
-                    print(f"Error code: {error_details.error_code}")
-                    print(f"Error message: {error_details.error_details}")
-                    
-                    # If we hit rate limit, update counter and raise for retry
-                    if "429" in str(error_details.error_code):
-                        self.consecutive_429s += 1
-                        raise Exception("Rate limit exceeded")
-                    
-            if success:
-                self.consecutive_429s = 0  # Reset counter on success
-                # Add a small delay after successful generation
-                await asyncio.sleep(0.5)  # 0.5 second delay after each successful generation
-            return success
-            
-        except Exception as e:
-            print(f"Exception during audio generation: {str(e)}")
-            raise
+        """Generate audio for a single line of dialogue."""
+        return await self.backend.synthesize(text, voice_name, output_path)
 
-    def combine_audio_files(self, input_files: List[str], output_file: str):
-        """Combine multiple WAV files into a single file."""
+    def combine_audio_files(self, input_files: List[str], output_file):
+        """Combine multiple WAV files into a single file (a path or a writable file object)."""
         # Read the first file to get audio parameters
         with wave.open(input_files[0], 'rb') as first_wav:
             params = first_wav.getparams()
@@ -123,12 +44,19 @@ class PodcastAudioRecorder:
                 with wave.open(input_file, 'rb') as wav:
                     output_wav.writeframes(wav.readframes(wav.getnframes()))
 
-    async def generate_podcast_audio(self, script_data: Dict) -> str:
+    async def generate_podcast_audio(
+        self,
+        script_data: Dict,
+        run_id: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> str:
         """
         Generate audio for the entire podcast script.
         
         Args:
             script_data: Dictionary containing the podcast script
+            run_id: Artifact store run to save the recording into (a new run if not given)
+            cancel_token: Stop synthesizing (raising RunCancelled) once the run is abandoned
             
         Returns:
             Path to the generated audio file
@@ -140,63 +68,72 @@ class PodcastAudioRecorder:
         print(f"Generating audio for podcast: {topic}")
         print(f"Number of dialogue lines: {len(dialogue)}")
         
-        # Create temporary directory for segments
-        os.makedirs('temp_audio', exist_ok=True)
-        segment_files = []
-        failed_segments = []
+        # Make sure every voice has a connected synthesizer before the first line
+        await asyncio.to_thread(self.backend.warm_up, voices.values())
         
-        # Generate audio for each line
-        for i, line in enumerate(dialogue, 1):
+        # Create a private temporary directory for segments so concurrent runs don't clash
+        temp_dir = tempfile.mkdtemp(prefix='temp_audio_')
+        semaphore = asyncio.Semaphore(self.max_concurrent_segments)
+        
+        async def process_line(i: int, line: Dict) -> Optional[str]:
             role = line["role"]
             text = line["text"]
             voice = voices[role]
+            segment_path = os.path.join(temp_dir, f"segment_{i}.wav")
             
-            print(f"Processing line {i}/{len(dialogue)} - {role}")
-            segment_path = f"temp_audio/segment_{i}.wav"
-            
-            try:
-                # Wait for the previous segment to complete and add delay
-                await asyncio.sleep(1)  # 1 second base delay between segments
+            async with semaphore:
+                print(f"Processing line {i}/{len(dialogue)} - {role}")
+                try:
+                    # Wait for the previous segment to complete and add delay
+                    await asyncio.sleep(1)  # 1 second base delay between segments
+                    
+                    check_cancelled(cancel_token)
+                    success = await self.generate_audio_segment(text, voice, segment_path)
+                    if not success:
+                        print(f"Failed to generate audio for line {i}")
+                        return None
+                except RunCancelled:
+                    raise
+                except Exception as e:
+                    print(f"Exception processing line {i}: {str(e)}")
+                    return None
                 
-                success = await self.generate_audio_segment(text, voice, segment_path)
-                if success:
-                    segment_files.append(segment_path)
-                else:
-                    failed_segments.append(i)
-                    print(f"Failed to generate audio for line {i}")
-            except Exception as e:
-                failed_segments.append(i)
-                print(f"Exception processing line {i}: {str(e)}")
-            
-            # Add a longer pause every 5 lines to avoid rate limiting
-            if i % 5 == 0:
-                print(f"Pausing for 5 seconds after line {i}...")
-                await asyncio.sleep(5)
+                # Add a longer pause every 5 lines to avoid rate limiting
+                if i % 5 == 0:
+                    print(f"Pausing for 5 seconds after line {i}...")
+                    await asyncio.sleep(5)
+            return segment_path
+        
+        # Generate audio for each line; segments keep script order whatever order they finish in
+        try:
+            results = await run_cancellable(asyncio.gather(*[
+                process_line(i, line) for i, line in enumerate(dialogue, 1)
+            ]), cancel_token)
+        except RunCancelled:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        segment_files = [path for path in results if path]
+        failed_segments = [i for i, path in enumerate(results, 1) if not path]
         
         if not segment_files:
+            shutil.rmtree(temp_dir, ignore_errors=True)
             raise Exception("No audio segments were generated successfully")
         
         if failed_segments:
             print(f"Warning: Failed to generate audio for {len(failed_segments)} lines: {failed_segments}")
-        
-        # Create output directory and final path
-        os.makedirs('output', exist_ok=True)
-        output_path = f"output/{topic.replace(' ', '_').lower()}_podcast.wav"
+        if getattr(self.backend, "usage", None):
+            print(f"Lines synthesized per TTS backend: {self.backend.usage}")
         
         # Combine all segments
         print("Combining audio segments...")
-        self.combine_audio_files(segment_files, output_path)
+        buffer = io.BytesIO()
+        self.combine_audio_files(segment_files, buffer)
+        
+        store, run_id = resolve_run(topic, run_id)
+        output_path = store.write_bytes(run_id, "podcast.wav", buffer.getvalue())
         
         # Clean up temporary files
-        for file in segment_files:
-            try:
-                os.remove(file)
-            except:
-                pass
-        try:
-            os.rmdir('temp_audio')
-        except:
-            pass
+        shutil.rmtree(temp_dir, ignore_errors=True)
             
         print(f"Audio saved to: {output_path}")
         return output_path
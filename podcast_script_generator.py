@@ -1,10 +1,12 @@
-import json
 import os
-from typing import Dict, List
+import re
+from typing import Dict, List, Optional
 from llama_index.llms.azure_openai import AzureOpenAI
 from llama_index.core.llms import ChatMessage
 import asyncio
 from dotenv import load_dotenv
+from artifact_store import resolve_run
+from cancellation import CancellationToken, check_cancelled, run_cancellable
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +16,269 @@ os.environ["OPENAI_API_KEY"] = os.getenv("AZURE_OPENAI_KEY")
 os.environ["AZURE_OPENAI_ENDPOINT"] = os.getenv("AZURE_OPENAI_ENDPOINT")
 os.environ["OPENAI_API_VERSION"] = os.getenv("AZURE_OPENAI_API_VERSION")
 
+MODERATOR = "MODERATOR"
+MODERATOR_VOICE = "en-US-GuyNeural"
+
+# Debaters are assigned to perspectives in this order; the first two are the classic for/against pair
+DEBATER_ROSTER = [
+    {
+        "role": "MR. YES",
+        "voice": "en-US-TonyNeural",
+        "personality": "enthusiastic, optimistic, and sometimes a bit over-the-top in his support"
+    },
+    {
+        "role": "MS. NO",
+        "voice": "en-US-JennyNeural",
+        "personality": "skeptical, witty, and occasionally sarcastic in her opposition"
+    },
+    {
+        "role": "MR. MAYBE",
+        "voice": "en-US-DavisNeural",
+        "personality": "calm, pragmatic, and fond of weighing trade-offs out loud"
+    },
+    {
+        "role": "MS. PERHAPS",
+        "voice": "en-US-AriaNeural",
+        "personality": "sharp, data-driven, and impatient with hand-waving"
+    },
+    {
+        "role": "MR. WHY NOT",
+        "voice": "en-US-JasonNeural",
+        "personality": "a playful contrarian who loves unconventional angles"
+    },
+    {
+        "role": "MS. NOT YET",
+        "voice": "en-US-SaraNeural",
+        "personality": "cautious, practical, and focused on hidden costs"
+    }
+]
+
+# Sections of the debate, in order. `essay_section` names the part of each essay the
+# section is built from when the script is generated section-wise.
+SCRIPT_SECTIONS = [
+    {
+        "key": "introduction",
+        "title": "Introduction",
+        "essay_section": "introduction",
+        "instructions": """- [MODERATOR] welcomes audience, introduces topic
+                    - [MODERATOR] introduces debators and format
+                    - Each debator gives 30-second opening statement"""
+    },
+    *[
+        {
+            "key": f"round_{n}",
+            "title": f"Main Discussion - Round {n}",
+            "essay_section": f"key_point_{n}",
+            "instructions": f"""This is round {n} of 3 of the main discussion, built on key point {n} of each side.
+                    - [MODERATOR] introduces the subtopic
+                    - Each debator presents their argument with conviction and their own personality
+                    - The others respond with skepticism and clever counterpoints
+                    - Allow brief back-and-forth with some friendly banter
+                    - [MODERATOR] summarizes and transitions"""
+        }
+        for n in (1, 2, 3)
+    ],
+    {
+        "key": "counter_arguments",
+        "title": "Counter-Arguments Section",
+        "essay_section": "counter_arguments",
+        "instructions": """- [MODERATOR] asks each side to address opposing views
+                    - Each debator responds to main counter-arguments
+                    - Brief discussion of points of agreement/disagreement"""
+    },
+    {
+        "key": "closing",
+        "title": "Closing Statements",
+        "essay_section": "conclusion",
+        "instructions": """- Each debator gives 45-second closing statement
+                    - [MODERATOR] summarizes key points and concludes"""
+    }
+]
+
+ESSAY_HEADERS = {
+    "introduction": r"#\s*Introduction",
+    "key_point_1": r"##\s*Key Point 1",
+    "key_point_2": r"##\s*Key Point 2",
+    "key_point_3": r"##\s*Key Point 3",
+    "counter_arguments": r"#\s*Addressing Counter-Arguments",
+    "conclusion": r"#\s*Conclusion"
+}
+
+def split_essay_sections(essay: str) -> Dict[str, str]:
+    """
+    Split an essay written with the research workflow's template into its sections.
+    Sections whose header can't be found map to the whole essay so callers always get context.
+    """
+    positions = []
+    for key, header in ESSAY_HEADERS.items():
+        match = re.search(rf"^\s*{header}.*$", essay, re.MULTILINE | re.IGNORECASE)
+        if match:
+            positions.append((match.start(), key))
+    positions.sort()
+
+    sections = {}
+    for i, (start, key) in enumerate(positions):
+        end = positions[i + 1][0] if i + 1 < len(positions) else len(essay)
+        sections[key] = essay[start:end].strip()
+
+    return {key: sections.get(key, essay) for key in ESSAY_HEADERS}
+
+def assign_debaters(perspectives: List[Dict]) -> List[Dict]:
+    """
+    Pair each perspective ({"stance_type", "stance", "essay"}) with a debater from the roster.
+    Returns the perspectives extended with the debater's role, voice and personality.
+    """
+    if len(perspectives) > len(DEBATER_ROSTER):
+        raise ValueError(f"At most {len(DEBATER_ROSTER)} debaters are supported")
+
+    debaters = []
+    for persona, perspective in zip(DEBATER_ROSTER, perspectives):
+        if perspective["stance_type"] == "for":
+            argues = "Presents arguments for the topic with confidence and enthusiasm"
+        elif perspective["stance_type"] == "against":
+            argues = "Presents arguments against the topic with skepticism and wit"
+        else:
+            argues = f"Argues that {perspective['stance']}"
+        debaters.append({**persona, **perspective, "argues": argues})
+    return debaters
+
+def script_voices(debaters: List[Dict]) -> Dict[str, str]:
+    """Voice assignments for the moderator and every debater."""
+    voices = {MODERATOR: MODERATOR_VOICE}
+    voices.update({debater["role"]: debater["voice"] for debater in debaters})
+    return voices
+
+class ScriptValidationError(ValueError):
+    """Raised when a script is still missing sections after the broken ones were regenerated."""
+
+# A whole line of stage direction or commentary, e.g. "(laughs)" or "*Music fades*"
+_STAGE_DIRECTION = re.compile(r"^[\(\[\*_].*[\)\]\*_]$")
+# A horizontal rule between parts of the script: "---", "***", "= = ="
+_SEPARATOR = re.compile(r"^([-*_=~]\s*){3,}$")
+# Anything shaped like a speaker tag, even for a role we don't know: "HOST (laughing): ..."
+_SPEAKER_TAG = re.compile(r"^(?:[-*>]\s+)?[*_]*\[?[A-Z][A-Z .'-]*\]?[*_]*\s*(?:\([^)]*\))?\s*[*_]*\s*:")
+_HEADER_MARK = re.compile(r"^(#{1,6}|\*\*|={2,}|-{3,})")
+_NUMBERING = re.compile(r"^\W*\d+[.)]\s*")
+
+def _role_pattern(roles: List[str]) -> re.Pattern:
+    # Longest first so "MS. NO" doesn't claim the lines of "MS. NOT YET"
+    alternatives = '|'.join(re.escape(role) for role in sorted(roles, key=len, reverse=True))
+    # Tolerates bullets, markdown emphasis, missing brackets and a delivery note:
+    # "- **[MR. YES]:** ...", "MR. YES: ...", "MR. YES (laughing): ..."
+    return re.compile(
+        rf"^(?:[-*>]\s+)?[*_]*\[?(?P<role>{alternatives})\]?[*_]*\s*(?:\([^)]*\))?\s*[*_]*\s*:\s*(?P<text>.*)$",
+        re.IGNORECASE
+    )
+
+def _header_words(text: str) -> str:
+    # Plural-insensitive so "Closing Statement" and "Counter-Argument" still name their sections
+    return ' '.join(word.rstrip('s') for word in re.findall(r"[a-z0-9]+", text.lower()))
+
+def _name_pattern(name: str) -> re.Pattern:
+    # A section name at the start of a line, alone or before a subtitle ("Round 1: Price")
+    words = r"\W+".join(rf"{re.escape(word)}s?" for word in _header_words(name).split())
+    return re.compile(rf"^\W*{words}\W*?(?:$|\s*[:\-\u2013\u2014(|])", re.IGNORECASE)
+
+_SECTION_NAMES = [
+    (section["key"], _name_pattern(name))
+    for section in SCRIPT_SECTIONS
+    for name in (section["title"], section["key"].replace('_', ' '))
+]
+
+def _section_key(line: str) -> Optional[str]:
+    """
+    Key of the script section a header line opens. Marked-up headers ("## Main Discussion
+    - Round 2", "**Closing Statements**") only need to mention the section; other lines
+    must start with the section's name, alone or followed by a subtitle ("Closing
+    Statements", "2. Main Discussion - Round 1: Price").
+    """
+    marked = _HEADER_MARK.match(line)
+    unnumbered = _NUMBERING.sub('', line)
+    for key, pattern in _SECTION_NAMES:
+        if pattern.match(unnumbered):
+            return key
+    normalized = _header_words(unnumbered)
+    if marked:
+        for section in SCRIPT_SECTIONS:
+            if _header_words(section["key"].replace('_', ' ')) in normalized:
+                return section["key"]
+    return None
+
+def _parse_script(text: str, roles: List[str]) -> List[tuple]:
+    """Parse a model response into (section key or None, dialogue entry) pairs in order."""
+    pattern = _role_pattern(roles)
+    canonical = {role.lower(): role for role in roles}
+    parsed = []
+    section = None
+    continuing = False
+
+    for line in text.strip().split('\n'):
+        line = line.strip()
+        if not line:
+            continuing = False
+            continue
+
+        match = pattern.match(line)
+        if match:
+            spoken = match.group('text').strip().strip('*_').strip()
+            continuing = bool(spoken)
+            if spoken:  # Only add if we have actual text content
+                parsed.append((section, {"role": canonical[match.group('role').lower()], "text": spoken}))
+            continue
+
+        key = _section_key(line)
+        if key:
+            section = key
+            continuing = False
+        elif _SEPARATOR.match(line) or _SPEAKER_TAG.match(line):
+            # A rule, or someone else talking: never part of the previous speaker's line
+            continuing = False
+        elif continuing and not _STAGE_DIRECTION.match(line):
+            # A speaker's line wrapped onto the next line
+            parsed[-1][1]["text"] += f" {line}"
+
+    return parsed
+
+def parse_dialogue(text: str, roles: List[str]) -> List[Dict]:
+    """Parse `[ROLE]: text` lines for the given roles from a model response into dialogue entries."""
+    return [entry for _, entry in _parse_script(text, roles)]
+
+def parse_script_sections(text: str, roles: List[str]) -> Dict[str, List[Dict]]:
+    """
+    Parse a whole-debate response whose sections start with header lines into
+    {section key: dialogue}. Dialogue before the first header belongs to the first section.
+    """
+    sections = {section["key"]: [] for section in SCRIPT_SECTIONS}
+    for key, entry in _parse_script(text, roles):
+        sections[key or SCRIPT_SECTIONS[0]["key"]].append(entry)
+    return sections
+
+def validate_section(lines: List[Dict], roles: List[str]) -> List[str]:
+    """Problems with one section's dialogue: it must exist and every role must speak in it."""
+    if not lines:
+        return ["no dialogue"]
+    speakers = {line["role"] for line in lines}
+    missing = [role for role in roles if role not in speakers]
+    return [f"{', '.join(missing)} never speaks"] if missing else []
+
+def _headers_missed(sections: Dict[str, List[Dict]]) -> bool:
+    """
+    Whether a whole-debate response's section headers mostly weren't recognised, leaving
+    dialogue filed under the wrong section: most sections empty, or a section missing
+    while another holds at least twice the usual amount.
+    """
+    sizes = [len(sections[section["key"]]) for section in SCRIPT_SECTIONS]
+    filled = sorted(size for size in sizes if size)
+    if len(filled) < len(sizes) / 2:
+        return True
+    if len(filled) == len(sizes):
+        return False
+    return filled[-1] >= 2 * filled[len(filled) // 2]
+
+def _prompt_lines(lines: List[str]) -> str:
+    """Join lines for embedding in one of our indented prompt templates."""
+    return '\n                    '.join(lines)
+
 class PodcastScriptGenerator:
     def __init__(self):
         self.llm = AzureOpenAI(
@@ -23,113 +288,267 @@ class PodcastScriptGenerator:
             max_tokens=10000
         )
 
-    async def generate_script(self, topic: str, for_essay: str, against_essay: str) -> Dict:
-        """Generate a podcast script from the debate essays."""
+    async def generate_script(
+        self,
+        topic: str,
+        for_essay: Optional[str] = None,
+        against_essay: Optional[str] = None,
+        run_id: Optional[str] = None,
+        parallel: bool = False,
+        perspectives: Optional[List[Dict]] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Dict:
+        """
+        Generate a podcast script from the debate essays.
+        Pass `for_essay`/`against_essay` for a classic two-sided debate, or `perspectives`
+        (a list of {"stance_type", "stance", "essay"}) for a panel of any size.
+        With `parallel=True` the debate sections are generated concurrently and stitched together.
+        Raises RunCancelled, aborting outstanding completions, once `cancel_token` is cancelled.
+        """
+        if perspectives is None:
+            perspectives = [
+                {"stance_type": "for", "stance": "for the topic", "essay": for_essay},
+                {"stance_type": "against", "stance": "against the topic", "essay": against_essay}
+            ]
+        debaters = assign_debaters(perspectives)
+
+        if parallel:
+            script = await run_cancellable(self._generate_sections(topic, debaters, cancel_token), cancel_token)
+        else:
+            script = await run_cancellable(self._generate_full(topic, debaters, cancel_token), cancel_token)
+
+        # Save the script to a JSON file in the run's artifact namespace
+        store, run_id = resolve_run(topic, run_id)
         
-        prompt = f'''Create an engaging podcast debate script about "{topic}" using these essays.
-                    For stance essay: {for_essay}
-                    Against stance essay: {against_essay}
+        script_data = {
+            "topic": topic,
+            "dialogue": script,
+            "voices": script_voices(debaters)
+        }
+        
+        store.write_json(run_id, "podcast_script.json", script_data)
+            
+        return script_data
 
-                    Create a natural dialogue between three roles:
-                    [MODERATOR]: Guides discussion, asks questions, maintains balance
-                    [MR. YES]: Presents arguments for the topic with confidence and enthusiasm
-                    [MS. NO]: Presents arguments against the topic with skepticism and wit
+    def _describe_roles(self, debaters: List[Dict]) -> str:
+        return _prompt_lines(
+            [f"[{MODERATOR}]: Guides discussion, asks questions, maintains balance"]
+            + [f"[{debater['role']}]: {debater['argues']}" for debater in debaters]
+        )
 
-                    The script should follow this structure:
+    def _describe_personalities(self, debaters: List[Dict]) -> str:
+        return _prompt_lines(
+            [f"- {debater['role']} should be {debater['personality']}" for debater in debaters]
+        )
 
-                    1. Introduction
-                    - [MODERATOR] welcomes audience, introduces topic
-                    - [MODERATOR] introduces debators and format
-                    - Each debator gives 30-second opening statement
+    def _format_example(self, debaters: List[Dict], with_headers: bool = False) -> str:
+        lines = (
+            [f"[{MODERATOR}]: Welcome to today's debate on..."]
+            + [f"[{debater['role']}]: ..." for debater in debaters]
+        )
+        if with_headers:
+            lines = (
+                [f"## {SCRIPT_SECTIONS[0]['title']}"] + lines
+                + [f"## {SCRIPT_SECTIONS[1]['title']}", f"[{MODERATOR}]: ...", "..."]
+            )
+        return _prompt_lines(lines)
 
-                    2. Main Discussion (3 rounds)
-                    For each key point:
-                    - [MODERATOR] introduces the subtopic
-                    - [MR. YES] presents argument with conviction and passion
-                    - [MS. NO] responds with skepticism and clever counterpoints
-                    - Allow brief back-and-forth with some friendly banter
-                    - [MODERATOR] summarizes and transitions
+    def _roles(self, debaters: List[Dict]) -> List[str]:
+        return [MODERATOR] + [debater['role'] for debater in debaters]
 
-                    3. Counter-Arguments Section
-                    - [MODERATOR] asks each side to address opposing views
-                    - Each debator responds to main counter-arguments
-                    - Brief discussion of points of agreement/disagreement
+    def _assemble(self, sections: Dict[str, List[Dict]]) -> List[Dict]:
+        """Stitch section dialogue together in debate order, refusing a script with holes."""
+        missing = [section["key"] for section in SCRIPT_SECTIONS if not sections.get(section["key"])]
+        if missing:
+            raise ScriptValidationError(f"No usable dialogue for script sections: {', '.join(missing)}")
+        return [line for section in SCRIPT_SECTIONS for line in sections[section["key"]]]
 
-                    4. Closing Statements
-                    - Each debator gives 45-second closing statement
-                    - [MODERATOR] summarizes key points and concludes
+    async def _generate_full(
+        self,
+        topic: str,
+        debaters: List[Dict],
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Dict]:
+        """
+        Generate the whole debate in one completion. Sections that come back missing or
+        without every speaker are regenerated on their own and spliced in.
+        """
+        essays = _prompt_lines(
+            [f"{debater['role']}'s essay ({debater['stance']}): {debater['essay']}" for debater in debaters]
+        )
+        structure = _prompt_lines([
+            f"{i}. {section['title']}\n                    {section['instructions']}\n"
+            for i, section in enumerate(SCRIPT_SECTIONS, 1)
+        ])
+        names = ' and '.join(debater['role'] for debater in debaters)
 
-                    IMPORTANT: Format your response EXACTLY like this example:
-                    [MODERATOR]: Welcome to today's debate on...
-                    [MR. YES]: Thank you. I believe that...
-                    [MS. NO]: I appreciate the opportunity to...
+        prompt = f'''Create an engaging podcast debate script about "{topic}" using these essays.
+                    {essays}
+
+                    Create a natural dialogue between {len(debaters) + 1} roles:
+                    {self._describe_roles(debaters)}
+
+                    The script should follow this structure:
+
+                    {structure}
+
+                    IMPORTANT: Start each section with its header line (## and the section name above),
+                    then its dialogue. Format your response EXACTLY like this example:
+                    {self._format_example(debaters, with_headers=True)}
                     
                     Keep each line under 50 words for better TTS processing.
                     Use natural, conversational language while maintaining professionalism.
-                    Add some attitude and spiciness to MR. YES and MS. NO's dialogue - they should have distinct personalities:
-                    - MR. YES should be enthusiastic, optimistic, and sometimes a bit over-the-top in his support
-                    - MS. NO should be skeptical, witty, and occasionally sarcastic in her opposition
+                    Add some attitude and spiciness to the dialogue of {names} - they should have distinct personalities:
+                    {self._describe_personalities(debaters)}
                     Make sure to include all sections of the debate structure.'''
 
+        check_cancelled(cancel_token)
         response = await self.llm.acomplete(prompt)
         
-        # Parse the response into dialogue entries
-        lines = str(response).strip().split('\n')
-        script = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check for role markers
-            if '[MODERATOR]:' in line:
-                role = 'MODERATOR'
-                text = line.split('[MODERATOR]:')[1].strip()
-            elif '[MR. YES]:' in line:
-                role = 'MR. YES'
-                text = line.split('[MR. YES]:')[1].strip()
-            elif '[MS. NO]:' in line:
-                role = 'MS. NO'
-                text = line.split('[MS. NO]:')[1].strip()
-            else:
-                continue
-                
-            if text:  # Only add if we have actual text content
-                script.append({"role": role, "text": text})
-
-        # Verify we have content
-        if not script:
-            print("Warning: No dialogue was generated. Raw response:")
-            print(str(response))
-            script = [{"role": "MODERATOR", "text": "Error: Failed to generate proper dialogue."}]
-
-        # Save the script to a JSON file
-        os.makedirs('output', exist_ok=True)
-        filename = f"output/{topic.replace(' ', '_').lower()}_podcast_script.json"
-        
-        script_data = {
-            "topic": topic,
-            "dialogue": script,
-            "voices": {
-                "MODERATOR": "en-US-GuyNeural",
-                "MR. YES": "en-US-TonyNeural",
-                "MS. NO": "en-US-JennyNeural"
-            }
-        }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(script_data, f, indent=2, ensure_ascii=False)
-            
-        return script_data
+        # Parse the response into sections and check each has everyone speaking
+        roles = self._roles(debaters)
+        sections = parse_script_sections(str(response), roles)
+        broken = {}
+        for section in SCRIPT_SECTIONS:
+            problems = validate_section(sections[section["key"]], roles)
+            if problems:
+                broken[section["key"]] = problems
+        if not broken:
+            return self._assemble(sections)
+        if _headers_missed(sections):
+            # Splicing repairs in would repeat dialogue that is only filed under the wrong section
+            print("Warning: Script sections couldn't be told apart; generating them one by one")
+            return await self._generate_sections(topic, debaters, cancel_token)
+
+        # Re-request only the broken sections, each from its part of the essays
+        print(f"Warning: Regenerating {len(broken)} of {len(SCRIPT_SECTIONS)} script sections: {broken}")
+        essay_sections = [split_essay_sections(debater['essay']) for debater in debaters]
+        repairs = [section for section in SCRIPT_SECTIONS if section["key"] in broken]
+        repaired = await asyncio.gather(*[
+            self._generate_section(
+                topic,
+                section,
+                debaters,
+                [sections_of[section["essay_section"]] for sections_of in essay_sections],
+                cancel_token=cancel_token
+            )
+            for section in repairs
+        ])
+        for section, lines in zip(repairs, repaired):
+            # Keep whatever the first pass had unless the retry is an improvement
+            if lines and (not sections[section["key"]] or not validate_section(lines, roles)):
+                sections[section["key"]] = lines
+
+        return self._assemble(sections)
+
+    async def _generate_sections(
+        self,
+        topic: str,
+        debaters: List[Dict],
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Dict]:
+        """Generate every debate section concurrently, then stitch them in order."""
+        essay_sections = [split_essay_sections(debater['essay']) for debater in debaters]
+
+        section_scripts = await asyncio.gather(*[
+            self._generate_section(
+                topic,
+                section,
+                debaters,
+                [sections[section["essay_section"]] for sections in essay_sections],
+                cancel_token=cancel_token
+            )
+            for section in SCRIPT_SECTIONS
+        ])
+
+        return self._assemble({
+            section["key"]: lines for section, lines in zip(SCRIPT_SECTIONS, section_scripts)
+        })
+
+    async def _generate_section(
+        self,
+        topic: str,
+        section: Dict,
+        debaters: List[Dict],
+        contexts: List[str],
+        attempts: int = 2,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Dict]:
+        """
+        Generate the dialogue for one debate section, retrying while it fails validation.
+        Returns the best attempt, which is empty only if nothing parseable ever came back.
+        """
+        position = SCRIPT_SECTIONS.index(section)
+        if position == 0:
+            continuity = "This is the opening of the podcast."
+        elif position == len(SCRIPT_SECTIONS) - 1:
+            continuity = "The debate is already under way; do not welcome the audience again. This section ends the podcast."
+        else:
+            continuity = "The debate is already under way; do not welcome the audience again or say goodbye. Pick up as if continuing from the previous section."
+
+        essays = _prompt_lines([
+            f"Relevant part of {debater['role']}'s essay ({debater['stance']}): {context}"
+            for debater, context in zip(debaters, contexts)
+        ])
+
+        prompt = f'''You are writing ONE section of an engaging podcast debate script about "{topic}".
+                    {continuity}
+
+                    {essays}
+
+                    The dialogue is between {len(debaters) + 1} roles:
+                    {self._describe_roles(debaters)}
+
+                    Write only this section:
+                    {section["instructions"]}
+
+                    IMPORTANT: Format your response EXACTLY like this example:
+                    {self._format_example(debaters)}
+
+                    Keep each line under 50 words for better TTS processing.
+                    Use natural, conversational language while maintaining professionalism.
+                    {self._describe_personalities(debaters)}'''
+
+        roles = self._roles(debaters)
+        best = []
+        for _ in range(attempts):
+            check_cancelled(cancel_token)
+            response = await self.llm.acomplete(prompt)
+            lines = parse_dialogue(str(response), roles)
+            if not validate_section(lines, roles):
+                return lines
+            # Otherwise remember the attempt where the most speakers got a word in
+            if (len({line["role"] for line in lines}), len(lines)) > (len({line["role"] for line in best}), len(best)):
+                best = lines
+        if best:
+            print(f"Warning: Section '{section['key']}' is incomplete: {'; '.join(validate_section(best, roles))}")
+        return best
 
-async def generate_podcast_script(topic: str, for_essay: str, against_essay: str) -> Dict:
+async def generate_podcast_script(
+    topic: str,
+    for_essay: Optional[str] = None,
+    against_essay: Optional[str] = None,
+    run_id: Optional[str] = None,
+    parallel: bool = False,
+    perspectives: Optional[List[Dict]] = None,
+    cancel_token: Optional[CancellationToken] = None
+) -> Dict:
     """
     Generate a podcast script from debate essays.
     Returns a dictionary containing the script and voice assignments.
+    Set `parallel` to generate the debate sections concurrently, and `perspectives`
+    for debates with more than two sides. `cancel_token` stops generation early.
     """
     generator = PodcastScriptGenerator()
-    return await generator.generate_script(topic, for_essay, against_essay)
+    return await generator.generate_script(
+        topic,
+        for_essay,
+        against_essay,
+        run_id=run_id,
+        parallel=parallel,
+        perspectives=perspectives,
+        cancel_token=cancel_token
+    )
 
 # Test code
 async def test_script_generation():
@@ -0,0 +1,306 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_CORPUS_DIR = os.getenv("RESEARCH_CORPUS_DIR", "research_corpus")
+DEFAULT_MAX_AGE_SECONDS = float(os.getenv("RESEARCH_CORPUS_MAX_AGE_DAYS", "30")) * 86400
+# Each chunk costs 4 KB of vectors plus its text, so the default is roughly 250 MB on disk
+DEFAULT_MAX_CHUNKS = int(os.getenv("RESEARCH_CORPUS_MAX_CHUNKS", "50000"))
+EMBEDDING_DIM = 1024
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Function words carry no topical signal and would dominate short queries
+STOPWORDS = set("""
+a an the and or but if of to in on at for from by with about as into than then so that this these those
+is are was were be been being do does did have has had will would should could can may might must
+i me my we our you your he him his she her it its they them their what which who whom how why when where
+not no yes very just also more most some any all new
+""".split())
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def chunk_text(text: str, max_chars: int = 800) -> List[str]:
+    """Split text into chunks of whole sentences, each at most about `max_chars` long."""
+    chunks = []
+    current = ''
+    for sentence in _SENTENCE_END.split(' '.join(text.split())):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f"{current} {sentence}".strip()
+        # A single enormous "sentence" (tables, lists) is cut hard
+        while len(current) > max_chars:
+            chunks.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _feature(token: str):
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+    value = int.from_bytes(digest, 'little')
+    return value % EMBEDDING_DIM, 1.0 if (value >> 63) & 1 else -1.0
+
+def embed_texts(texts: Iterable[str]) -> np.ndarray:
+    """
+    Embed texts locally with signed feature hashing of words and word bigrams.
+    Returns L2-normalised float32 rows, so a dot product is the cosine similarity.
+    """
+    texts = list(texts)
+    vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts: Dict[str, int] = {}
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            index, sign = _feature(feature)
+            vectors[row, index] += sign * (1.0 + np.log(count))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class ResearchCorpus:
+    """
+    Persistent store of chunked research material with a memory-mapped vector index.
+
+    Vectors live in a flat float32 file (`vectors.f32`), with the matching chunk records
+    appended line by line to `chunks.jsonl`; row i of one is line i of the other. Searches
+    memory-map the vectors, so the index isn't loaded into RAM and appends from other runs
+    become visible without a rebuild. Writes are serialised within the process.
+
+    The corpus is capped by age and size: once chunks are older than `max_age_seconds` or
+    there are more than `max_chunks` of them (with some slack, so this isn't done on every
+    append), both files are rewritten keeping only the newest chunks within the limits.
+
+    Every chunk records the query and run that added it. Searches can leave out a run's
+    own chunks, so a run is only ever "covered" by what earlier runs found (including for
+    the same query), never by the search results it just produced.
+    """
+
+    def __init__(
+        self,
+        root: str = DEFAULT_CORPUS_DIR,
+        min_score: float = 0.35,
+        min_hits: int = 4,
+        min_urls: int = 3,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        max_chunks: int = DEFAULT_MAX_CHUNKS
+    ):
+        self.root = root
+        self.vectors_path = os.path.join(root, 'vectors.f32')
+        self.chunks_path = os.path.join(root, 'chunks.jsonl')
+        # Present while a compaction swaps in the rewritten files (see _finish_compaction)
+        self.compacting_path = os.path.join(root, 'compacting')
+        self.max_age_seconds = max_age_seconds
+        self.max_chunks = max_chunks
+        # Coverage thresholds: how many chunks, from how many pages, must be this similar to
+        # skip a fresh search. Hashed word features put a snippet that merely shares a few
+        # words with a stance around 0.25-0.3; material about the same claim scores 0.4+.
+        self.min_score = min_score
+        self.min_hits = min_hits
+        self.min_urls = min_urls
+
+        self._lock = threading.Lock()
+        self._chunks: List[Dict] = []
+        self._hashes = set()
+        # Row numbers by the run that added them, for excluding them cheaply
+        self._rows_by_run: Dict[str, List[int]] = {}
+        self._matrix = None
+        self._matrix_rows = 0
+
+        os.makedirs(root, exist_ok=True)
+        self._finish_compaction()
+        self._load()
+        with self._lock:
+            self._compact_if_needed()
+
+    def _load(self):
+        if os.path.exists(self.chunks_path):
+            with open(self.chunks_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self._chunks.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # A torn final line from an interrupted append
+        vector_rows = 0
+        if os.path.exists(self.vectors_path):
+            vector_rows = os.path.getsize(self.vectors_path) // (4 * EMBEDDING_DIM)
+
+        # After a crash between the two appends, trust only rows present in both files
+        rows = min(len(self._chunks), vector_rows)
+        if rows != len(self._chunks) or rows != vector_rows:
+            self._chunks = self._chunks[:rows]
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(rows * 4 * EMBEDDING_DIM)
+            with open(self.chunks_path, 'w', encoding='utf-8') as f:
+                for chunk in self._chunks:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+        self._reindex()
+
+    def _reindex(self):
+        self._hashes = {chunk['hash'] for chunk in self._chunks}
+        self._rows_by_run = {}
+        for row, chunk in enumerate(self._chunks):
+            self._index_row(row, chunk)
+
+    def _finish_compaction(self):
+        """
+        Complete a compaction interrupted after both rewritten files were ready. Until the
+        marker exists the old files are untouched, so there is nothing to finish.
+        """
+        if not os.path.exists(self.compacting_path):
+            return
+        for path in (self.vectors_path, self.chunks_path):
+            if os.path.exists(path + '.tmp'):
+                os.replace(path + '.tmp', path)
+        os.remove(self.compacting_path)
+
+    def _compact_if_needed(self):
+        """Drop chunks past the age or size cap. Call with the lock held."""
+        if not self._chunks:
+            return
+        cutoff = time.time() - self.max_age_seconds
+        too_old = self._chunks[0].get('added_at', 0) < cutoff - self.max_age_seconds / 10
+        too_many = len(self._chunks) > self.max_chunks * 1.1
+        if not (too_old or too_many):
+            return
+
+        # Rows are in append order, so the newest are at the end
+        keep = [row for row, chunk in enumerate(self._chunks) if chunk.get('added_at', 0) >= cutoff]
+        keep = keep[-self.max_chunks:]
+        matrix = self._index()
+        vectors = np.ascontiguousarray(matrix[keep]) if keep else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        chunks = [self._chunks[row] for row in keep]
+
+        with open(self.vectors_path + '.tmp', 'wb') as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.chunks_path + '.tmp', 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        # From here on a crash is finished on the next start instead of mixing old and new rows
+        with open(self.compacting_path, 'w') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self._finish_compaction()
+
+        print(f"Research corpus compacted: kept {len(chunks)} of {len(self._chunks)} chunks")
+        self._chunks = chunks
+        self._matrix = None
+        self._matrix_rows = 0
+        self._reindex()
+
+    def _index_row(self, row: int, chunk: Dict):
+        if chunk.get('run'):
+            self._rows_by_run.setdefault(chunk['run'], []).append(row)
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add_documents(self, documents: Iterable[Dict], run: str = '') -> int:
+        """
+        Chunk, embed and append documents ({"url", "text", "query"}) found by `run` to the
+        corpus. Chunks already in the corpus are skipped. Returns how many chunks were added.
+        """
+        records = []
+        for document in documents:
+            for text in chunk_text(document.get('text') or ''):
+                digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+                records.append({
+                    "hash": digest,
+                    "url": document.get('url', ''),
+                    "query": document.get('query', ''),
+                    "run": run,
+                    "text": text,
+                    "added_at": time.time()
+                })
+
+        with self._lock:
+            new_records = []
+            for record in records:
+                if record['hash'] not in self._hashes:
+                    self._hashes.add(record['hash'])
+                    new_records.append(record)
+            if not new_records:
+                return 0
+
+            vectors = embed_texts(record['text'] for record in new_records)
+            # Vectors first: a crash then leaves extra rows, which _load trims
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.chunks_path, 'a', encoding='utf-8') as f:
+                for record in new_records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            for record in new_records:
+                self._index_row(len(self._chunks), record)
+                self._chunks.append(record)
+            self._compact_if_needed()
+            return len(new_records)
+
+    def _index(self):
+        """Memory-map the vectors, re-mapping only when rows were appended."""
+        rows = len(self._chunks)
+        if self._matrix is None or self._matrix_rows != rows:
+            if rows == 0:
+                return None
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, EMBEDDING_DIM))
+            self._matrix_rows = rows
+        return self._matrix
+
+    def search(self, query: str, k: int = 8, exclude_run: Optional[str] = None) -> List[Dict]:
+        """
+        Top-k chunks by cosine similarity to the query, best first, each with a `score`.
+        Chunks added by `exclude_run` are left out.
+        """
+        with self._lock:
+            matrix = self._index()
+            chunks = self._chunks[:self._matrix_rows] if matrix is not None else []
+            excluded = list(self._rows_by_run.get(exclude_run, [])) if exclude_run else []
+        if matrix is None:
+            return []
+
+        scores = matrix @ embed_texts([query])[0]
+        excluded = [row for row in excluded if row < len(scores)]
+        if excluded:
+            scores[excluded] = -np.inf
+        k = min(k, len(scores) - len(excluded))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**chunks[i], "score": float(scores[i])} for i in top]
+
+    def is_covered(self, hits: List[Dict]) -> bool:
+        """
+        Whether search hits are good enough to use instead of a fresh web search: enough
+        close matches, spread over enough different pages. Pass hits from a search that
+        excluded the asking run, so a run never covers itself.
+        """
+        close = [hit for hit in hits if hit['score'] >= self.min_score]
+        urls = {hit['url'] for hit in close if hit['url']}
+        return len(close) >= self.min_hits and len(urls) >= self.min_urls
+
+_default_corpus = None
+_default_corpus_lock = threading.Lock()
+
+def get_research_corpus() -> ResearchCorpus:
+    """Process-wide corpus shared by all runs."""
+    global _default_corpus
+    with _default_corpus_lock:
+        if _default_corpus is None:
+            _default_corpus = ResearchCorpus()
+        return _default_corpus
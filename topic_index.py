@@ -0,0 +1,227 @@
+import os
+import re
+import json
+import time
+import threading
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+from artifact_store import ArtifactStore, get_artifact_store
+
+# Words that change how a topic is phrased, not what it is about. Words that are also
+# content in real topics ("the US", "a career in IT", "a tin can", "any/some of") stay out.
+FILLER_WORDS = set("""
+a an the i we my me our you your its is are be do does did to of
+should shall would could will really actually currently latest new
+please worth worthwhile
+""".split())
+# Words that flip a question's meaning; topics must agree on them to match
+NEGATION_WORDS = {"not", "no", "never", "without", "don", "doesn", "isn", "aren", "shouldn", "won", "t"}
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Acronyms are kept even when they spell a filler word ("ME", "DO" the country/state codes)
+_ACRONYM_PATTERN = re.compile(r"\b[A-Z]{2,}\b")
+# British/American spelling differences, rewritten to one form ("colour" -> "color")
+_SPELLING_RULES = [
+    (re.compile(r"ll"), "l"),                                      # cancelling, travelled
+    (re.compile(r"(?<=..)our(?=s|ed|ing|ite|ful|able|$)"), "or"),  # colour, favourite
+    (re.compile(r"(?<=...)is(e|ed|er|ing|ation)$"), r"iz\1"),      # organise, organisation
+    (re.compile(r"ys(e|ed|ing)$"), r"yz\1"),                       # analyse
+    (re.compile(r"(?<=..)tre$"), "ter"),                           # centre, theatre
+    (re.compile(r"ogue$"), "og"),                                  # catalogue
+    (re.compile(r"(?<=...)ence$"), "ense"),                        # defence, licence
+    (re.compile(r"mme$"), "m"),                                    # programme
+    (re.compile(r"^grey$"), "gray"),
+]
+
+# Minimum topic_similarity for a stored debate to stand in for a new topic
+DEFAULT_THRESHOLD = 0.8
+
+# Artifacts a run needs before it can stand in for a new one
+REQUIRED_ARTIFACTS = ("research.json", "podcast_script.json", "podcast.wav")
+
+def _stem(token: str) -> str:
+    # Plural-insensitive matching ("headphones" vs "headphone") without a stemmer dependency
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def normalize_topic(topic: str) -> str:
+    """Reduce a topic to its content words: lowercase, no punctuation, no filler, singular."""
+    # An all-caps topic is just shouting, not a string of acronyms
+    acronyms = set() if topic.isupper() else {word.lower() for word in _ACRONYM_PATTERN.findall(topic)}
+    tokens = _TOKEN_PATTERN.findall(topic.lower())
+    return ' '.join(
+        token if token in acronyms else _stem(token)
+        for token in tokens if token not in FILLER_WORDS or token in acronyms
+    )
+
+def _anchor_words(words: set) -> set:
+    return {word for word in words if word in NEGATION_WORDS or any(char.isdigit() for char in word)}
+
+def _spelling_key(word: str) -> str:
+    for pattern, replacement in _SPELLING_RULES:
+        word = pattern.sub(replacement, word)
+    return word
+
+def _variant_pairs(words_a: set, words_b: set) -> Optional[List[tuple]]:
+    """
+    Pair up words that only one topic has as spelling variants of each other
+    ("colour"/"color"), or None if any word has no variant on the other side.
+    """
+    by_key: Dict[str, List[str]] = {}
+    for word in words_a:
+        by_key.setdefault(_spelling_key(word), []).append(word)
+    pairs = []
+    for word in sorted(words_b):
+        candidates = by_key.get(_spelling_key(word))
+        if not candidates:
+            return None
+        pairs.append((candidates.pop(), word))
+    if any(by_key.values()):
+        return None
+    return pairs
+
+def topic_similarity(a: str, b: str) -> float:
+    """
+    Similarity of two topics in [0, 1] from their normalized content words. Topics match
+    only if they have the same content words, up to word order and spelling variants
+    ("colour" vs "color"); any other differing word makes them different topics
+    ("California" vs "Texas"), and so does a differing number, model name ("Switch 2" vs
+    "Switch 3", "PS4" vs "PS5") or negation. Matches through spelling variants score a
+    little below 1.
+    """
+    norm_a, norm_b = normalize_topic(a), normalize_topic(b)
+    if norm_a == norm_b:
+        return 1.0
+    words_a, words_b = set(norm_a.split()), set(norm_b.split())
+    if not words_a or not words_b:
+        return 0.0
+    if _anchor_words(words_a) != _anchor_words(words_b):
+        return 0.0
+
+    pairs = _variant_pairs(words_a - words_b, words_b - words_a)
+    if pairs is None:
+        return 0.0
+    shared = len(words_a & words_b)
+    variant_score = sum(SequenceMatcher(None, word_a, word_b).ratio() for word_a, word_b in pairs)
+    return (shared + variant_score) / (shared + len(pairs))
+
+class TopicIndex:
+    """
+    Index of completed debates by topic, used to reuse a debate instead of re-running
+    the pipeline for the same question phrased differently.
+
+    Entries live in `<store root>/topic_index.json` next to the runs they point at.
+    Runs removed by the store's garbage collection are skipped and pruned.
+    """
+
+    def __init__(self, store: Optional[ArtifactStore] = None, threshold: float = DEFAULT_THRESHOLD):
+        self.store = store or get_artifact_store()
+        self.path = os.path.join(self.store.root, 'topic_index.json')
+        self.threshold = threshold
+        self._lock = threading.Lock()
+
+    def _read(self) -> List[Dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _write(self, entries: List[Dict]):
+        data = json.dumps(entries, indent=2, ensure_ascii=False).encode('utf-8')
+        ArtifactStore._atomic_write(self.path, data)
+
+    def _is_complete(self, run_id: str) -> bool:
+        try:
+            return all(os.path.exists(self.store.path(run_id, name)) for name in REQUIRED_ARTIFACTS)
+        except ValueError:
+            return False
+
+    def record(self, topic: str, run_id: str, num_perspectives: int = 2):
+        """Register a finished run for a topic."""
+        with self._lock:
+            # Re-read so entries recorded by other processes are kept
+            entries = [entry for entry in self._read() if self._is_complete(entry["run_id"])]
+            entries.append({
+                "topic": topic,
+                "normalized": normalize_topic(topic),
+                "run_id": run_id,
+                "num_perspectives": num_perspectives,
+                "created_at": time.time()
+            })
+            self._write(entries)
+
+    def find(self, topic: str, num_perspectives: int = 2) -> Optional[Dict]:
+        """
+        The most similar completed debate with the same number of perspectives, or None
+        if nothing reaches the similarity threshold. Newer runs win ties.
+        """
+        best, best_score = None, self.threshold
+        for entry in reversed(self._read()):
+            if entry.get("num_perspectives", 2) != num_perspectives:
+                continue
+            score = topic_similarity(topic, entry["topic"])
+            if score >= best_score and (best is None or score > best_score) and self._is_complete(entry["run_id"]):
+                best, best_score = {**entry, "similarity": score}, score
+        return best
+
+    def load_debate(self, run_id: str) -> Optional[Dict]:
+        """
+        Load a stored debate: the research result, podcast script and artifact paths.
+        Returns None if the run has been removed or is incomplete.
+        """
+        if not self._is_complete(run_id):
+            return None
+        try:
+            with open(self.store.path(run_id, "research.json"), 'r', encoding='utf-8') as f:
+                research = json.load(f)
+            with open(self.store.path(run_id, "podcast_script.json"), 'r', encoding='utf-8') as f:
+                script = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        illustration_path = self.store.path(run_id, "debate_illustration.png")
+        return {
+            "run_id": run_id,
+            "research": research,
+            "script": script,
+            "audio_path": self.store.path(run_id, "podcast.wav"),
+            "illustration_path": illustration_path if os.path.exists(illustration_path) else None
+        }
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+def get_topic_index() -> TopicIndex:
+    """Process-wide topic index over the shared artifact store."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None or _default_index.store is not get_artifact_store():
+            _default_index = TopicIndex()
+        return _default_index
+
+def main():
+    # Sanity-check the matching rules on phrasings that should and shouldn't share a debate
+    cases = [
+        ("Should I buy the Switch 2?", "should i buy a switch 2", True),
+        ("Is the grey colour iPhone worth it", "Is the gray color iPhone worth it", True),
+        ("Cancelling my gym membership", "Canceling my gym memberships", True),
+        ("Should I move to the US?", "Should I move?", False),
+        ("Should I start a career in IT?", "Should I start a career?", False),
+        ("Should I buy any of these?", "Should I buy these?", False),
+        ("SHOULD I BUY A SWITCH 2", "should i buy the switch 2", True),
+        ("Should I move to California for a tech job", "Should I move to Texas for a tech job", False),
+        ("Best laptop for photography and gaming", "Best laptop for work and gaming", False),
+        ("Should I buy a Switch 2", "Should I buy a Switch 3", False),
+        ("Should I buy PS5", "Should I not buy PS5", False),
+    ]
+    failures = 0
+    for a, b, expected in cases:
+        score = topic_similarity(a, b)
+        ok = (score >= DEFAULT_THRESHOLD) == expected
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {score:.3f}  {a!r} vs {b!r}")
+    print(f"{failures} of {len(cases)} cases failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,783 @@
+import os
+import io
+import time
+import wave
+import array
+import queue
+import random
+import asyncio
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from azure.cognitiveservices.speech import (
+    SpeechConfig,
+    SpeechSynthesizer,
+    SpeechSynthesisOutputFormat,
+    Connection,
+    ResultReason,
+    CancellationErrorCode
+)
+from dotenv import load_dotenv
+
+try:
+    import pyttsx3
+except ImportError:  # The offline engine is optional
+    pyttsx3 = None
+
+load_dotenv()
+
+# Every backend writes segments in this format so they can be concatenated directly
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+
+class RateLimitError(Exception):
+    """The TTS service rejected a request because of its rate limit or quota (HTTP 429)."""
+
+class SpeechServiceError(Exception):
+    """The TTS service failed for reasons unrelated to the line (connection, auth, outage)."""
+
+class TTSBackend:
+    """A text-to-speech engine that writes one line of dialogue to a WAV file."""
+
+    name = "base"
+    # How many lines it makes sense to synthesize at once
+    parallelism = 1
+
+    def warm_up(self, voice_names: Iterable[str]):
+        """Prepare the backend for these voices ahead of the first line (optional)."""
+
+    async def synthesize(self, text: str, voice_name: str, output_path: str) -> bool:
+        """
+        Write `text` spoken with `voice_name` to `output_path`.
+        Returns False on a permanent failure; raises RateLimitError when throttled.
+        """
+        raise NotImplementedError
+
+def convert_wav(data: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Convert 16-bit PCM WAV bytes to mono at `sample_rate` using linear interpolation."""
+    with wave.open(io.BytesIO(data), 'rb') as wav:
+        params = wav.getparams()
+        frames = wav.readframes(wav.getnframes())
+
+    if params.sampwidth != SAMPLE_WIDTH:
+        raise ValueError(f"Unsupported sample width: {params.sampwidth * 8} bits")
+
+    samples = array.array('h', frames)
+    if params.nchannels > 1:
+        # Average the channels down to mono
+        samples = array.array('h', [
+            sum(samples[i:i + params.nchannels]) // params.nchannels
+            for i in range(0, len(samples), params.nchannels)
+        ])
+
+    if params.framerate != sample_rate and samples:
+        ratio = params.framerate / sample_rate
+        length = int(len(samples) / ratio)
+        last = len(samples) - 1
+        resampled = array.array('h', bytes(length * SAMPLE_WIDTH))
+        for i in range(length):
+            position = i * ratio
+            index = int(position)
+            fraction = position - index
+            following = samples[min(index + 1, last)]
+            resampled[i] = int(samples[index] + (following - samples[index]) * fraction)
+        samples = resampled
+
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    return output.getvalue()
+
+# Upper bound on open synthesizers per voice and resource. Each concurrent line of the same
+# voice needs its own, so size this for recorder parallelism x sessions expected at once.
+DEFAULT_SYNTHESIZERS_PER_VOICE = int(os.getenv("AZURE_SPEECH_SYNTHESIZERS_PER_VOICE", "8"))
+
+class SpeechSynthesizerPool:
+    """
+    Long-lived Azure speech synthesizers per voice, shared across lines, runs and sessions.
+
+    Each synthesizer has its own SpeechConfig with the voice baked in, so concurrent lines
+    never race on a shared config, and its service connection stays open so segments
+    don't pay connection setup. Synthesizers are opened on demand, up to
+    `synthesizers_per_voice` per voice; beyond that lines wait for a free one. Audio comes
+    back in memory as RIFF/WAV.
+    """
+
+    def __init__(self, speech_key: str, service_region: str, synthesizers_per_voice: Optional[int] = None):
+        self.speech_key = speech_key
+        self.service_region = service_region
+        self.synthesizers_per_voice = synthesizers_per_voice or DEFAULT_SYNTHESIZERS_PER_VOICE
+        self._idle: Dict[str, queue.Queue] = {}
+        self._open: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _create_synthesizer(self, voice_name: str):
+        speech_config = SpeechConfig(
+            subscription=self.speech_key,
+            region=self.service_region
+        )
+        speech_config.speech_synthesis_voice_name = voice_name
+        speech_config.set_speech_synthesis_output_format(SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm)
+
+        # audio_config=None keeps the audio in result.audio_data instead of playing/writing it
+        synthesizer = SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        connection = Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+        return synthesizer, connection
+
+    def _pool_for(self, voice_name: str) -> queue.Queue:
+        with self._lock:
+            pool = self._idle.get(voice_name)
+            if pool is None:
+                pool = queue.Queue()
+                self._idle[voice_name] = pool
+                self._open[voice_name] = 0
+            return pool
+
+    def _try_open(self, voice_name: str):
+        """Open another synthesizer for a voice if it is under its limit, else return None."""
+        with self._lock:
+            if self._open[voice_name] >= self.synthesizers_per_voice:
+                return None
+            self._open[voice_name] += 1
+        try:
+            return self._create_synthesizer(voice_name)
+        except BaseException:
+            # Give the slot back so a later line can try again
+            with self._lock:
+                self._open[voice_name] -= 1
+            raise
+
+    def warm_up(self, voice_names: Iterable[str]):
+        """Open and connect one synthesizer for each of these voices that has none yet."""
+        for voice_name in set(voice_names):
+            pool = self._pool_for(voice_name)
+            with self._lock:
+                needed = self._open[voice_name] == 0
+            if needed:
+                entry = self._try_open(voice_name)
+                if entry:
+                    pool.put(entry)
+
+    def warm_up_in_background(self, voice_names: Iterable[str]):
+        """Warm up on a daemon thread so callers can keep going while connections open."""
+        threading.Thread(
+            target=self.warm_up,
+            args=(list(voice_names),),
+            name='speech-warm-up',
+            daemon=True
+        ).start()
+
+    def _checkout(self, voice_name: str, abandoned: Optional[threading.Event], poll_interval: float = 0.25):
+        pool = self._pool_for(voice_name)
+        while True:
+            try:
+                return pool.get_nowait()
+            except queue.Empty:
+                pass
+            entry = self._try_open(voice_name)
+            if entry:
+                return entry
+            try:
+                return pool.get(timeout=poll_interval)
+            except queue.Empty:
+                if abandoned is not None and abandoned.is_set():
+                    return None
+
+    def _release(self, voice_name: str, entry, healthy: bool):
+        if healthy:
+            self._idle[voice_name].put(entry)
+            return
+
+        # Don't hand a synthesizer that failed mid-request out again
+        try:
+            entry[1].close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open[voice_name] -= 1
+        try:
+            replacement = self._try_open(voice_name)
+            if replacement:
+                self._idle[voice_name].put(replacement)
+        except Exception as e:
+            # The slot stays free, so the next line for this voice opens a new one itself
+            print(f"Failed to replace speech synthesizer for {voice_name}: {str(e)}")
+
+    @contextmanager
+    def acquire(self, voice_name: str, abandoned: Optional[threading.Event] = None):
+        """
+        Borrow a synthesizer for a voice, waiting while all of its synthesizers are busy.
+        Yields None if `abandoned` is set before one becomes free.
+        """
+        entry = self._checkout(voice_name, abandoned)
+        if entry is None:
+            yield None
+            return
+        healthy = True
+        try:
+            yield entry[0]
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            self._release(voice_name, entry, healthy)
+
+    def speak(self, text: str, voice_name: str, abandoned: Optional[threading.Event] = None) -> tuple:
+        """
+        Synthesize text with a pooled synthesizer (blocking). Returns the SDK result and
+        the seconds the service took, not counting the wait for a free synthesizer;
+        the result is None if `abandoned` was set before synthesis started.
+        """
+        with self.acquire(voice_name, abandoned) as synthesizer:
+            if synthesizer is None or (abandoned is not None and abandoned.is_set()):
+                return None, 0.0
+            started = time.monotonic()
+            result = synthesizer.speak_text_async(text).get()
+            return result, time.monotonic() - started
+
+_synthesizer_pools: Dict[tuple, SpeechSynthesizerPool] = {}
+_synthesizer_pools_lock = threading.Lock()
+
+def get_synthesizer_pool(
+    speech_key: Optional[str] = None,
+    service_region: Optional[str] = None,
+    synthesizers_per_voice: Optional[int] = None
+) -> SpeechSynthesizerPool:
+    """
+    Process-wide synthesizer pool for a speech resource (defaults to the environment's).
+    Its per-voice limit comes from AZURE_SPEECH_SYNTHESIZERS_PER_VOICE unless a caller
+    asks for more with `synthesizers_per_voice`.
+    """
+    speech_key = speech_key or os.getenv("AZURE_SUBSCRIPTION_KEY")
+    service_region = service_region or os.getenv("AZURE_SERVICE_REGION")
+
+    if not speech_key or not service_region:
+        raise ValueError("Azure Speech credentials not found in environment variables")
+
+    with _synthesizer_pools_lock:
+        pool = _synthesizer_pools.get((speech_key, service_region))
+        if pool is None:
+            pool = SpeechSynthesizerPool(speech_key, service_region, synthesizers_per_voice)
+            _synthesizer_pools[(speech_key, service_region)] = pool
+        elif synthesizers_per_voice and synthesizers_per_voice > pool.synthesizers_per_voice:
+            pool.synthesizers_per_voice = synthesizers_per_voice
+        return pool
+
+# Cancellation codes that mean the speech resource itself is unwell, not the line
+SERVICE_ERROR_CODES = {
+    CancellationErrorCode.AuthenticationFailure,
+    CancellationErrorCode.Forbidden,
+    CancellationErrorCode.ConnectionFailure,
+    CancellationErrorCode.ServiceTimeout,
+    CancellationErrorCode.ServiceError,
+    CancellationErrorCode.ServiceUnavailable,
+    CancellationErrorCode.RuntimeError
+}
+
+class AzureTTSBackend(TTSBackend):
+    """
+    Azure Speech through a pre-connected synthesizer pool, with client-side pacing.
+
+    Raises RateLimitError when throttled and SpeechServiceError when the resource fails
+    (connection, auth, outage); returns False for lines the service won't synthesize.
+    `on_latency` is called with the service time of every line that succeeds.
+    """
+
+    name = "azure"
+
+    def __init__(
+        self,
+        synthesizer_pool: Optional[SpeechSynthesizerPool] = None,
+        on_latency: Optional[Callable[[float], None]] = None
+    ):
+        self.synthesizer_pool = synthesizer_pool or get_synthesizer_pool()
+        self.on_latency = on_latency
+
+        # Rate limiting settings - increase delay and add jitter
+        self.request_delay = 1.0  # Base delay of 1 second
+        self.jitter = 0.5  # Add random jitter of up to 0.5 seconds
+        self.last_request_time = 0
+        self.consecutive_429s = 0  # Track consecutive 429 errors
+        self.max_429_backoff = 30  # Maximum backoff in seconds
+        self._rate_limit_lock = None
+
+    def warm_up(self, voice_names: Iterable[str]):
+        self.synthesizer_pool.warm_up(voice_names)
+
+    async def _wait_for_rate_limit(self):
+        """Ensure we don't exceed rate limits by adding delay between requests."""
+        # Created lazily so the lock belongs to the running event loop
+        if self._rate_limit_lock is None:
+            self._rate_limit_lock = asyncio.Lock()
+
+        async with self._rate_limit_lock:
+            current_time = time.time()
+            time_since_last = current_time - self.last_request_time
+
+            # Calculate delay with jitter and potential backoff
+            base_delay = self.request_delay
+            if self.consecutive_429s > 0:
+                # Exponential backoff when hitting rate limits
+                backoff = min(2 ** self.consecutive_429s, self.max_429_backoff)
+                base_delay += backoff
+
+            # Add random jitter
+            delay = base_delay + random.uniform(0, self.jitter)
+
+            if time_since_last < delay:
+                await asyncio.sleep(delay - time_since_last)
+            self.last_request_time = time.time()
+
+    async def synthesize(self, text: str, voice_name: str, output_path: str) -> bool:
+        # Rate limiting
+        await self._wait_for_rate_limit()
+
+        # Generate speech on a pooled synthesizer without blocking the event loop
+        abandoned = threading.Event()
+        try:
+            result, seconds = await asyncio.to_thread(self.synthesizer_pool.speak, text, voice_name, abandoned)
+        except asyncio.CancelledError:
+            # The thread can't be interrupted, but it won't start synthesizing once told this
+            abandoned.set()
+            raise
+        if result is None:
+            return False
+        success = result.reason == ResultReason.SynthesizingAudioCompleted
+
+        if not success:
+            print(f"Error synthesizing audio: {result.reason}")
+            if result.cancellation_details:
+                error_details = result.cancellation_details
+                print(f"Error details: {error_details.reason}")
+                print(f"Error code: {error_details.error_code}")
+                print(f"Error message: {error_details.error_details}")
+
+                # If we hit rate limit, update counter and let the caller decide what to do
+                if error_details.error_code == CancellationErrorCode.TooManyRequests or "429" in str(error_details.error_details):
+                    self.consecutive_429s += 1
+                    raise RateLimitError("Rate limit exceeded")
+                if error_details.error_code in SERVICE_ERROR_CODES:
+                    raise SpeechServiceError(f"{error_details.error_code}: {error_details.error_details}")
+            return False
+
+        self.consecutive_429s = 0  # Reset counter on success
+        if self.on_latency:
+            self.on_latency(seconds)
+        with open(output_path, 'wb') as f:
+            f.write(result.audio_data)
+        # Add a small delay after successful generation
+        await asyncio.sleep(0.5)
+        return True
+
+def load_speech_shards() -> List[tuple]:
+    """
+    Azure Speech resources to spread synthesis over, as (key, region) pairs.
+
+    Read from AZURE_SPEECH_SHARDS ("key1@eastus,key2@westeurope,..."), falling back to
+    the single AZURE_SUBSCRIPTION_KEY / AZURE_SERVICE_REGION pair.
+    """
+    shards = []
+    for entry in os.getenv("AZURE_SPEECH_SHARDS", "").replace(';', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        speech_key, _, service_region = entry.rpartition('@')
+        if not speech_key or not service_region:
+            raise ValueError("AZURE_SPEECH_SHARDS entries must look like <key>@<region>")
+        shards.append((speech_key, service_region))
+
+    if not shards:
+        speech_key = os.getenv("AZURE_SUBSCRIPTION_KEY")
+        service_region = os.getenv("AZURE_SERVICE_REGION")
+        if not speech_key or not service_region:
+            raise ValueError("Azure Speech credentials not found in environment variables")
+        shards.append((speech_key, service_region))
+    return shards
+
+def warm_up_speech_in_background(voice_names: Iterable[str]):
+    """Pre-connect synthesizers for these voices on every configured speech resource."""
+    voice_names = list(voice_names)
+    for speech_key, service_region in load_speech_shards():
+        get_synthesizer_pool(speech_key, service_region).warm_up_in_background(voice_names)
+
+class SpeechShard:
+    """
+    Observed health of one Azure Speech resource, shared by every run in the process
+    (quota is per resource, not per run). Latency and 429 rate are exponentially
+    weighted moving averages; a shard that keeps failing is taken out for a cooldown.
+    """
+
+    def __init__(self, speech_key: str, service_region: str, smoothing: float = 0.3):
+        self.speech_key = speech_key
+        self.service_region = service_region
+        self.label = f"{service_region}/...{speech_key[-4:]}"
+        self.smoothing = smoothing
+
+        self.latency: Optional[float] = None  # Service seconds per line, None until measured
+        self.throttle_rate = 0.0              # Share of recent requests answered with 429
+        self.consecutive_failures = 0
+        self.cooldowns = 0
+        self.blocked_until = 0.0
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return time.time() >= self.blocked_until
+
+    def weight(self, default_latency: float) -> float:
+        """Relative share of lines: fast shards get more, throttled shards far fewer."""
+        latency = self.latency if self.latency is not None else default_latency
+        # Never quite zero, so a recovered shard still gets probed
+        return max((1.0 - self.throttle_rate) ** 2, 0.01) / max(latency, 0.05)
+
+    def _block(self, seconds: float, why: str):
+        self.blocked_until = time.time() + seconds
+        self.cooldowns += 1
+        print(f"Speech shard {self.label} {why}; resting it for {seconds:.0f}s")
+
+    def record_latency(self, latency: float):
+        """Service time of one line, excluding our own pacing and waits for a synthesizer."""
+        with self._lock:
+            self.latency = latency if self.latency is None else (
+                self.smoothing * latency + (1 - self.smoothing) * self.latency
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.throttle_rate *= 1 - self.smoothing
+            self.consecutive_failures = 0
+            self.cooldowns = 0
+            self.lines += 1
+
+    def record_throttled(self, cooldown: float):
+        with self._lock:
+            self.throttle_rate = self.smoothing + (1 - self.smoothing) * self.throttle_rate
+            # Two 429s in a row from a healthy shard cross this
+            if self.throttle_rate > 0.5:
+                self._block(min(cooldown * 2 ** self.cooldowns, 300), "is rate limited")
+
+    def record_failure(self, cooldown: float, max_failures: int = 3):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= max_failures:
+                self.consecutive_failures = 0
+                self._block(cooldown, "keeps failing")
+
+_speech_shards: Dict[tuple, SpeechShard] = {}
+_speech_shards_lock = threading.Lock()
+
+def get_speech_shard(speech_key: str, service_region: str) -> SpeechShard:
+    """Process-wide health record for a speech resource."""
+    with _speech_shards_lock:
+        shard = _speech_shards.get((speech_key, service_region))
+        if shard is None:
+            shard = SpeechShard(speech_key, service_region)
+            _speech_shards[(speech_key, service_region)] = shard
+        return shard
+
+class ShardedAzureTTSBackend(TTSBackend):
+    """
+    Spreads lines over several Azure Speech resources (keys and/or regions) so audio
+    throughput isn't capped by one resource's quota.
+
+    Each line goes to a shard picked at random, weighted by the shard's observed latency
+    and 429 rate. A throttled or failing shard hands the line to another shard, and
+    degraded shards sit out a cooldown. Only throttling and service errors count against
+    a shard; a line the service rejects for its content would fail on every shard, so it
+    just returns False. RateLimitError is raised only when every shard tried was
+    throttled, so a TTSRouter above can back off or overflow as before.
+    """
+
+    name = "azure"
+
+    def __init__(
+        self,
+        shards: Optional[List[tuple]] = None,
+        max_failover: int = 3,
+        throttle_cooldown: float = 30.0,
+        failure_cooldown: float = 60.0
+    ):
+        shards = shards or load_speech_shards()
+        self.shards = [get_speech_shard(speech_key, service_region) for speech_key, service_region in shards]
+        # Per-instance backends keep pacing state and locks on this run's event loop
+        self.backends = {
+            shard: AzureTTSBackend(
+                get_synthesizer_pool(shard.speech_key, shard.service_region),
+                on_latency=shard.record_latency
+            )
+            for shard in self.shards
+        }
+        self.max_failover = max_failover
+        self.throttle_cooldown = throttle_cooldown
+        self.failure_cooldown = failure_cooldown
+
+    @property
+    def parallelism(self) -> int:
+        return len(self.shards)
+
+    def warm_up(self, voice_names: Iterable[str]):
+        voice_names = list(voice_names)
+        for shard, backend in self.backends.items():
+            try:
+                backend.warm_up(voice_names)
+            except Exception as e:
+                # A shard that can't connect is found out (and rested) when lines go to it
+                print(f"Failed to warm up speech shard {shard.label}: {str(e)}")
+
+    def _choose(self, exclude: set) -> Optional[SpeechShard]:
+        candidates = [shard for shard in self.shards if shard not in exclude and shard.available()]
+        if not candidates:
+            return None
+        measured = [shard.latency for shard in self.shards if shard.latency is not None]
+        # Unmeasured shards are assumed average so they get explored
+        default_latency = sum(measured) / len(measured) if measured else 1.0
+        weights = [shard.weight(default_latency) for shard in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+    async def synthesize(self, text: str, voice_name: str, output_path: str) -> bool:
+        tried = set()
+        throttled = False
+        for _ in range(min(self.max_failover, len(self.shards))):
+            shard = self._choose(tried)
+            if shard is None:
+                break
+            tried.add(shard)
+
+            try:
+                success = await self.backends[shard].synthesize(text, voice_name, output_path)
+            except RateLimitError:
+                throttled = True
+                shard.record_throttled(self.throttle_cooldown)
+                continue
+            except Exception as e:
+                print(f"Speech shard {shard.label} failed: {str(e)}")
+                shard.record_failure(self.failure_cooldown)
+                continue
+
+            if success:
+                shard.record_success()
+                return True
+            # The line itself was refused (or the run abandoned); another shard won't do better
+            return False
+
+        if throttled or not tried:
+            raise RateLimitError("Every available speech shard is rate limited or cooling down")
+        # Let the caller retry the line later rather than drop it
+        raise SpeechServiceError("Every speech shard tried failed")
+
+def create_azure_backend() -> TTSBackend:
+    """Azure Speech over every configured resource; a plain backend when there is just one."""
+    shards = load_speech_shards()
+    if len(shards) == 1:
+        return AzureTTSBackend(get_synthesizer_pool(*shards[0]))
+    return ShardedAzureTTSBackend(shards)
+
+class LocalTTSBackend(TTSBackend):
+    """
+    Offline CPU text-to-speech through pyttsx3 (eSpeak on Linux, SAPI5 on Windows).
+
+    The engine is not thread-safe, so all synthesis runs on one dedicated worker thread.
+    Azure voice names are mapped onto the installed local voices in order of first use.
+    """
+
+    name = "local"
+
+    def __init__(self):
+        if pyttsx3 is None:
+            raise RuntimeError("pyttsx3 is not installed; the local TTS backend is unavailable")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='local-tts')
+        self._engine = None
+        self._local_voices: List[str] = []
+        self._voice_map: Dict[str, Optional[str]] = {}
+
+    def _get_engine(self):
+        # Runs on the worker thread: the engine must be created where it is used
+        if self._engine is None:
+            self._engine = pyttsx3.init()
+            self._local_voices = [voice.id for voice in self._engine.getProperty('voices')]
+        return self._engine
+
+    def start(self, timeout: float = 30.0):
+        """Create the engine on the worker thread now; raises if the system's TTS driver is unusable."""
+        self._executor.submit(self._get_engine).result(timeout=timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _local_voice_for(self, voice_name: str) -> Optional[str]:
+        if voice_name not in self._voice_map:
+            if self._local_voices:
+                index = len(self._voice_map) % len(self._local_voices)
+                self._voice_map[voice_name] = self._local_voices[index]
+            else:
+                self._voice_map[voice_name] = None
+        return self._voice_map[voice_name]
+
+    def _speak_to_file(self, text: str, voice_name: str, output_path: str) -> bool:
+        engine = self._get_engine()
+        local_voice = self._local_voice_for(voice_name)
+        if local_voice:
+            engine.setProperty('voice', local_voice)
+
+        fd, raw_path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            engine.save_to_file(text, raw_path)
+            engine.runAndWait()
+            with open(raw_path, 'rb') as f:
+                data = f.read()
+            if not data:
+                return False
+            # Match the cloud segments' format so they can be concatenated
+            with open(output_path, 'wb') as f:
+                f.write(convert_wav(data))
+            return True
+        except (wave.Error, ValueError, EOFError) as e:
+            print(f"Local TTS produced unusable audio: {str(e)}")
+            return False
+        finally:
+            try:
+                os.remove(raw_path)
+            except OSError:
+                pass
+
+    async def synthesize(self, text: str, voice_name: str, output_path: str) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._speak_to_file, text, voice_name, output_path)
+
+_local_backend = None
+_local_backend_unavailable = False
+_local_backend_lock = threading.Lock()
+
+def get_local_backend() -> Optional[LocalTTSBackend]:
+    """
+    Process-wide offline backend, or None when pyttsx3 isn't installed or its engine
+    can't start (e.g. eSpeak missing on Linux). The engine is only tried once.
+    """
+    global _local_backend, _local_backend_unavailable
+    if pyttsx3 is None:
+        return None
+    with _local_backend_lock:
+        if _local_backend is None and not _local_backend_unavailable:
+            backend = LocalTTSBackend()
+            try:
+                backend.start()
+                _local_backend = backend
+            except Exception as e:
+                print(f"Offline TTS unavailable, lines will only go to the cloud: {str(e)}")
+                backend.close()
+                _local_backend_unavailable = True
+        return _local_backend
+
+class TTSRouter(TTSBackend):
+    """
+    Sends lines to a primary (cloud) backend and routes overflow to a secondary (local) one.
+
+    A line that keeps getting throttled, or fails outright, is synthesized by the overflow
+    backend instead of being dropped. After `exhausted_after` rate-limited requests in a row
+    the primary is treated as out of quota and skipped for `quota_cooldown` seconds; the first
+    line after the cooldown probes it again. If the overflow can't take a line either, the
+    line goes back to the primary with exponential backoff rather than being dropped.
+    Without an overflow backend the router just retries the primary that way, as the
+    recorder always has.
+    """
+
+    def __init__(
+        self,
+        primary: TTSBackend,
+        overflow: Optional[TTSBackend] = None,
+        exhausted_after: int = 3,
+        quota_cooldown: float = 60.0
+    ):
+        self.primary = primary
+        self.overflow = overflow
+        self.exhausted_after = exhausted_after
+        self.quota_cooldown = quota_cooldown
+        # Give up on a line quickly when there is somewhere else to send it
+        self.primary_attempts = 2 if overflow else 5
+        self.consecutive_rate_limits = 0
+        self.primary_blocked_until = 0.0
+        self.usage: Dict[str, int] = {}
+
+    @property
+    def name(self) -> str:
+        return f"{self.primary.name}+{self.overflow.name}" if self.overflow else self.primary.name
+
+    @property
+    def parallelism(self) -> int:
+        return self.primary.parallelism
+
+    def warm_up(self, voice_names: Iterable[str]):
+        voice_names = list(voice_names)
+        self.primary.warm_up(voice_names)
+        if self.overflow:
+            self.overflow.warm_up(voice_names)
+
+    def primary_available(self) -> bool:
+        return time.time() >= self.primary_blocked_until
+
+    async def _try_primary(self, text: str, voice_name: str, output_path: str, patient: bool = False) -> bool:
+        """
+        Try the primary, giving up early when the line can go to the overflow instead.
+        With `patient` the line is retried with backoff as if there were no overflow,
+        even while the primary is being rested.
+        """
+        attempts = 5 if patient else self.primary_attempts
+        can_overflow = self.overflow is not None and not patient
+        for attempt in range(attempts):
+            if not patient and not self.primary_available():
+                return False
+            try:
+                success = await self.primary.synthesize(text, voice_name, output_path)
+                if success:
+                    self.consecutive_rate_limits = 0
+                return success
+            except RateLimitError:
+                self.consecutive_rate_limits += 1
+                if can_overflow and self.consecutive_rate_limits >= self.exhausted_after:
+                    print(f"{self.primary.name} TTS quota looks exhausted; routing lines to "
+                          f"{self.overflow.name} for {self.quota_cooldown:.0f}s")
+                    self.primary_blocked_until = time.time() + self.quota_cooldown
+                    self.consecutive_rate_limits = 0
+                    return False
+            except Exception as e:
+                print(f"Exception during audio generation: {str(e)}")
+                if can_overflow:
+                    return False
+
+            if attempt + 1 < attempts:
+                await asyncio.sleep(min(4 * 2 ** attempt, 30))
+        return False
+
+    async def _try_overflow(self, text: str, voice_name: str, output_path: str) -> bool:
+        try:
+            return await self.overflow.synthesize(text, voice_name, output_path)
+        except Exception as e:
+            print(f"{self.overflow.name} TTS failed: {str(e)}")
+            return False
+
+    async def synthesize(self, text: str, voice_name: str, output_path: str) -> bool:
+        backend = None
+        if await self._try_primary(text, voice_name, output_path):
+            backend = self.primary
+        elif self.overflow and await self._try_overflow(text, voice_name, output_path):
+            backend = self.overflow
+        elif self.overflow and await self._try_primary(text, voice_name, output_path, patient=True):
+            # The overflow couldn't take the line either; wait the primary out rather than drop it
+            backend = self.primary
+
+        if backend is None:
+            return False
+        self.usage[backend.name] = self.usage.get(backend.name, 0) + 1
+        return True
+
+def create_default_backend() -> TTSRouter:
+    """Azure Speech (sharded over every configured resource), with the offline engine as overflow when it is installed."""
+    return TTSRouter(create_azure_backend(), overflow=get_local_backend())